@@ -1,36 +1,55 @@
 import datetime
+import time
 from typing import List
 
+from models.EntityIndex import EntityIndex
 from models.Task import Task
-from utils.MemTime import query_tasks, set_entity_is_active
-from utils.LiquidPlanner import fetch_tasks_by_ids, fetch_my_account
-from utils.Util import ask_question
+from utils.MemTime import query_tasks, set_entities_is_active, READ_MODE_READONLY
+from utils.IdentityCache import fetch_cached_identity
+from utils.DoneStateStore import load_done_state_store, save_done_state_store, DONE_RECHECK_SECS
+from utils.TaskCache import fetch_cached_timed_tasks_by_ids
+from utils.Cli import build_parser, apply_arguments, run_script
+from utils.Util import ask_question, record_result, run_in_background
 
 
 EXPIRED_TASK_AGE_DAYS = 7
 
 def archive_memtime_tasks():
+    # The member ID does not depend on MemTime, so it is requested while tasks are read
+    identity_future = run_in_background(fetch_cached_identity)
+
     # Read all Tasks in MemTime and filter active tasks
     active_tasks = [task for task in query_tasks() if task.is_active]
+    entity_index = EntityIndex(active_tasks)
 
     # Filter LiquidPlanner IDs
-    liquid_planner_ids = list(set([task.liquid_planner_id for task in active_tasks if task.liquid_planner_id is not None]))
-
-    # Get All LiquidPlanner Tasks
-    liquid_planner_tasks = fetch_tasks_by_ids(liquid_planner_ids)
+    liquid_planner_ids = list(entity_index.tasks_by_liquid_planner_id.keys())
 
     # Get current member ID and expiry date string (UTC)
-    user_account = fetch_my_account()
-    member_id = user_account['id']
+    member_id = identity_future.result()['id']
 
+    now = time.time()
     current_datetime = datetime.datetime.now(datetime.timezone.utc)
     expiry_datetime = current_datetime - datetime.timedelta(days=EXPIRED_TASK_AGE_DAYS)
 
+    # Only get LiquidPlanner tasks which are not known to be done, or whose known done state is too old to archive them
+    done_state_store = load_done_state_store(member_id)
+    ids_to_check = [id for id in liquid_planner_ids if done_state_store.needs_check(id, expiry_datetime, now)]
+    # Cached assignments are never older than a known done state may be, and record when they were actually fetched
+    timed_tasks = fetch_cached_timed_tasks_by_ids(ids_to_check, ['parent_crumbs', 'name', 'assignments'], {'assignments': DONE_RECHECK_SECS})
+    done_state_store.update(timed_tasks)
+    liquid_planner_tasks = [task_json for task_json, _ in timed_tasks]
+
+    ids_checked = set(ids_to_check)
+    known_tasks = [done_state_store.get_task_json(id) for id in liquid_planner_ids if id not in ids_checked]
+    liquid_planner_tasks += [task_json for task_json in known_tasks if task_json is not None]
+    print(f'Checked {len(ids_to_check)}/{len(liquid_planner_ids)} tasks on LiquidPlanner, the rest are known to be done')
+    record_result('checked_tasks', len(ids_to_check))
+
     # Identify tasks to archive
     tasks_to_archive: List[Task] = []
     for lp_task in liquid_planner_tasks:
-        memtime_tasks = [task for task in active_tasks if task.liquid_planner_id == lp_task['id']]
-        for task in memtime_tasks:
+        for task in entity_index.get_tasks_by_liquid_planner_id(lp_task['id']):
             task.set_liquid_planner_task(lp_task, member_id)
             if task.is_expired(expiry_datetime):
                 tasks_to_archive.append(task)
@@ -44,12 +63,21 @@ def archive_memtime_tasks():
         print('\nIf there are any tasks above which you do not want to archive, toggle their done flag on LiquidPlanner before running this script again.')
         archive_tasks = ask_question('Do you want to archive the above tasks?')
         if archive_tasks:
-            for task in tasks_to_archive:
-                set_entity_is_active(task.id, False)
+            set_entities_is_active([task.id for task in tasks_to_archive], False)
+            record_result('archived_tasks', [task.label for task in tasks_to_archive])
+
+            # Tasks still active under the same LiquidPlanner ID keep their done state
+            archived_ids = set([task.id for task in tasks_to_archive])
+            liquid_planner_ids = [id for id in liquid_planner_ids
+                                  if any([task.id not in archived_ids for task in entity_index.get_tasks_by_liquid_planner_id(id)])]
     else:
         print('No tasks to archive')
 
+    done_state_store.retain(liquid_planner_ids)
+    save_done_state_store(done_state_store)
+
 
 if __name__ == '__main__':
-    archive_memtime_tasks()
-    exit(0)
+    args = build_parser('Archive MemTime tasks whose LiquidPlanner assignment has been done for a while.', READ_MODE_READONLY).parse_args()
+    apply_arguments(args)
+    run_script(args, archive_memtime_tasks)
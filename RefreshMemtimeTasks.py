@@ -1,14 +1,23 @@
+import argparse
 import datetime
-from typing import List, Tuple
+from typing import Dict, List, Set, Tuple
 
+from models.EntityIndex import EntityIndex
 from models.Project import Project
 from models.Task import Task
-from utils.MemTime import query_tasks, query_task_by_name, query_projects, insert_entity, set_entity_is_active, set_entity_name, SHARED_TIME_NAME, SHARED_TIME_COLOR
-from utils.LiquidPlanner import fetch_my_account, fetch_upcoming_tasks
-from utils.Util import ask_question, exit
+from utils.MemTime import get_database, query_tasks, query_task_by_name, query_projects, insert_entity, insert_entities, set_entities_is_active, set_entity_names, set_entity_parents, READ_MODE_READONLY, SHARED_TIME_NAME, SHARED_TIME_COLOR
+from utils.LiquidPlanner import fetch_upcoming_tasks, iter_upcoming_tasks, DEFAULT_UPCOMING_TASKS_PAGE_SIZE
+from utils.IdentityCache import fetch_cached_identity
+from utils.SyncState import load_sync_state, save_sync_state
+from utils.TaskCache import store_tasks
+from utils.Cli import build_parser, apply_arguments, run_script
+from utils.Util import ask_question, exit, record_result, run_in_background, set_answer, EXIT_CODE_FAILURE
 
 
 DAYS_TO_GET_TASKS = 12
+RENAME_ANSWER_KEY = 'rename'
+MOVE_ANSWER_KEY = 'move'
+DEFAULT_PROJECT_COLOR = '#bbbbbb'  # TODO: Colour
 
 def check_and_create_shared_time_entities():
     projects = query_projects(SHARED_TIME_NAME)
@@ -24,12 +33,12 @@ def check_and_create_shared_time_entities():
         create_memtime_task(None, SHARED_TIME_NAME, project_id)
         print('Created Shared Time task')
 
-def get_upcoming_tasks(member_id: int, days_to_get_tasks: int):
+def get_upcoming_tasks(member_id: int, days_to_get_tasks: int, page_size: int = DEFAULT_UPCOMING_TASKS_PAGE_SIZE, first_page: List[dict] = None):
     upcoming_tasks: List[dict] = []
     task_deadline_str = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=days_to_get_tasks)).strftime('%Y-%m-%dT%H:%M:%S')
-    task_batch = fetch_upcoming_tasks(100)
-    
-    for task in task_batch:
+
+    # Tasks are in priority order, so no more pages are requested once a task starts after the deadline
+    for task in iter_upcoming_tasks(page_size, first_page):
         assignments = [assignment for assignment in task['assignments'] if assignment['person_id'] == member_id]
         if len(assignments) > 0:
             assignment = assignments[0]
@@ -40,12 +49,16 @@ def get_upcoming_tasks(member_id: int, days_to_get_tasks: int):
         else:
             print('WARNING: ' + task['name'] + ' - Assignment not found')
 
+    # Upcoming tasks contain full task JSON, so keep the cache warm for the other scripts
+    store_tasks(upcoming_tasks)
+
     return upcoming_tasks
 
-def filter_tasks_to_create(member_id: int, upcoming_tasks: List[dict], memtime_tasks: List[Task]) -> Tuple[List[dict], List[Task], List[Task]]:
+def filter_tasks_to_create(member_id: int, upcoming_tasks: List[dict], entity_index: EntityIndex) -> Tuple[List[dict], List[Task], List[Task], List[Tuple[Task, int]]]:
     tasks_to_create: List[dict] = []
     tasks_to_set_active: List[Task] = []
     tasks_to_rename: List[Task] = []
+    tasks_to_move: List[Tuple[Task, int]] = []
 
     for lp_task in upcoming_tasks:
         # Ignore Inbox tasks for now as we won't know which MemTime project to assign them to
@@ -53,7 +66,7 @@ def filter_tasks_to_create(member_id: int, upcoming_tasks: List[dict], memtime_t
         if len(lp_task['parent_crumbs']) < 2:
             continue
         
-        associated_memtime_tasks = [task for task in memtime_tasks if task.liquid_planner_id == lp_task['id']]
+        associated_memtime_tasks = entity_index.get_tasks_by_liquid_planner_id(lp_task['id'])
 
         if len(associated_memtime_tasks) == 0:
             tasks_to_create.append(lp_task)
@@ -72,13 +85,19 @@ def filter_tasks_to_create(member_id: int, upcoming_tasks: List[dict], memtime_t
             # If an associated task exists but is named differently to LiquidPlanner, add to list to update name.
             if memtime_task.label != lp_task['name']:
                 tasks_to_rename.append(memtime_task)
+
+            # If an associated task is in the MemTime project of a different LiquidPlanner project, add to list to move.
+            # Tasks in projects without a LiquidPlanner ID were placed there by hand and are left alone.
+            memtime_project = entity_index.get_project(memtime_task.parent_id)
+            if memtime_project is not None and memtime_project.liquid_planner_id not in (None, lp_task['project_id']):
+                tasks_to_move.append((memtime_task, lp_task['project_id']))
     
-    return tasks_to_create, tasks_to_set_active, tasks_to_rename
+    return tasks_to_create, tasks_to_set_active, tasks_to_rename, tasks_to_move
 
-def map_tasks_to_memtime_project(tasks_to_create: List[dict], memtime_projects: List[Project]) -> List[Tuple[dict, Project]]:
+def map_tasks_to_memtime_project(tasks_to_create: List[dict], entity_index: EntityIndex) -> List[Tuple[dict, Project]]:
     valid_tasks_to_create: List[Tuple[dict, str, Project]] = []
     for task in tasks_to_create:
-        associated_memtime_projects = [project for project in memtime_projects if project.liquid_planner_id == task['project_id']]
+        associated_memtime_projects = entity_index.get_projects_by_liquid_planner_id(task['project_id'])
         if len(associated_memtime_projects) == 0:
             print(f'Error: No MemTime project exists with LiquidPlanner ID {task["project_id"]}')
             continue
@@ -90,7 +109,7 @@ def map_tasks_to_memtime_project(tasks_to_create: List[dict], memtime_projects:
         
     return valid_tasks_to_create
 
-def create_memtime_project(lp_id: int, name: str, color: str = '#bbbbbb') -> int:  # TODO: Colour
+def create_memtime_project(lp_id: int, name: str, color: str = DEFAULT_PROJECT_COLOR) -> int:
     return insert_entity(True, None, name, lp_id, color)
 
 def create_memtime_task(lp_id: int, name: str, parent_id: int) -> int:
@@ -103,11 +122,16 @@ def confirm_and_create_projects(projects_to_create: List[Tuple[int, str]]):
 
     confirmed = ask_question('\nAre you sure you want to create these new projects?')
     if not confirmed:
-        exit(1)
+        exit(EXIT_CODE_FAILURE)
 
-    for id, name in projects_to_create:
-        memtime_id = create_memtime_project(id, name)
+    # Every project is created in one transaction, so a failure leaves none of them behind
+    memtime_ids = insert_entities([(True, None, name, id, DEFAULT_PROJECT_COLOR) for id, name in projects_to_create])
+
+    created_projects: List[dict] = []
+    for (id, name), memtime_id in zip(projects_to_create, memtime_ids):
         print(f'Created project {name} ({id}) -> {memtime_id}')
+        created_projects.append({'liquid_planner_id': id, 'name': name, 'memtime_id': memtime_id})
+    record_result('created_projects', created_projects)
 
 def confirm_and_create_tasks(tasks_to_create: List[Tuple[dict, Project]]):
     print('\nNew tasks:')
@@ -116,46 +140,78 @@ def confirm_and_create_tasks(tasks_to_create: List[Tuple[dict, Project]]):
 
     confirmed = ask_question('\nAre you sure you want to create these new tasks?')
     if not confirmed:
-        exit(1)
+        exit(EXIT_CODE_FAILURE)
 
-    for task, memtime_project in tasks_to_create:
-        memtime_id = create_memtime_task(task["id"], task['name'], memtime_project.id)
+    memtime_ids = insert_entities([(False, memtime_project.id, task['name'], task['id'], None) for task, memtime_project in tasks_to_create])
+
+    created_tasks: List[dict] = []
+    for (task, _), memtime_id in zip(tasks_to_create, memtime_ids):
         print(f'Created task {task["name"]} ({task["id"]}) -> {memtime_id}')
+        created_tasks.append({'liquid_planner_id': task['id'], 'name': task['name'], 'memtime_id': memtime_id})
+    record_result('created_tasks', created_tasks)
+
+def main(page_size: int = DEFAULT_UPCOMING_TASKS_PAGE_SIZE):
+    # Neither the member ID nor the first page of upcoming tasks depend on MemTime, so both are requested while the
+    # database is read
+    identity_future = run_in_background(fetch_cached_identity)
+    first_page_future = run_in_background(fetch_upcoming_tasks, page_size)
 
-def main():
-    # Create Shared Time project and task if not exists
+    # Create Shared Time project and task if not exists, then read existing MemTime tasks
     check_and_create_shared_time_entities()
+    entity_index = EntityIndex(query_tasks(), query_projects())
 
-    # Get current member ID
-    user_account = fetch_my_account()
-    member_id = user_account['id']
+    # Get current member ID and upcoming LP tasks
+    member_id = identity_future.result()['id']
+    upcoming_tasks: List[dict] = get_upcoming_tasks(member_id, DAYS_TO_GET_TASKS, page_size, first_page_future.result())
+    # Ignore Inbox tasks for now as we won't know which MemTime project to assign them to
+    project_tasks = [task for task in upcoming_tasks if len(task['parent_crumbs']) >= 2]
+    liquid_planner_projects: Dict[int, str] = {task['project_id']: task['parent_crumbs'][1] for task in project_tasks}
+
+    # Only compare tasks and projects which changed on either side since the last refresh reconciled them
+    sync_state = load_sync_state(get_database().database_path, member_id)
+    changed_tasks = [task for task in project_tasks if not sync_state.is_task_synced(task, member_id, entity_index)]
+    changed_projects = {id: name for id, name in liquid_planner_projects.items() if not sync_state.is_project_synced(id, name, entity_index)}
+    print(f'{len(changed_tasks)}/{len(project_tasks)} upcoming tasks and {len(changed_projects)}/{len(liquid_planner_projects)} projects changed since the last refresh')
+    record_result('changed_tasks', len(changed_tasks))
+    record_result('changed_projects', len(changed_projects))
+
+    # LiquidPlanner IDs of tasks and projects left out of sync, which are compared again next time
+    unsynced_task_ids: Set[int] = set()
+    unsynced_project_ids: Set[int] = set()
 
-    # Get upcoming LP tasks and existing MemTime tasks
-    upcoming_tasks: List[dict] = get_upcoming_tasks(member_id, DAYS_TO_GET_TASKS)
-    memtime_tasks: List[Task] = query_tasks()
-    
     # Map LP tasks to MemTime tasks by LP URL and filter out new tasks to create
-    non_existing_tasks, tasks_to_set_active, tasks_to_rename = filter_tasks_to_create(member_id, upcoming_tasks, memtime_tasks)
-    
-    # Get MemTime projects and existing LiquidPlanner IDs
-    memtime_projects = query_projects()
-    existing_project_ids = [project.liquid_planner_id for project in memtime_projects if project.liquid_planner_id is not None]
+    non_existing_tasks, tasks_to_set_active, tasks_to_rename, tasks_to_move = filter_tasks_to_create(member_id, changed_tasks, entity_index)
 
-    # Filter projects to create
+    # Confirm moving tasks whose LiquidPlanner project has changed first, so their destination projects are only created
+    # or reactivated when the tasks will actually be moved into them
+    if len(tasks_to_move) > 0:
+        print('\nTasks to move:')
+        for memtime_task, project_id in tasks_to_move:
+            print(f'\t{memtime_task.label}: {entity_index.get_project(memtime_task.parent_id).label} ---> {liquid_planner_projects[project_id]}')
+
+        print()
+        move_tasks = ask_question('Do you want to move the above tasks?', answer_key=MOVE_ANSWER_KEY)
+        if not move_tasks:
+            unsynced_task_ids.update([memtime_task.liquid_planner_id for memtime_task, _ in tasks_to_move])
+            tasks_to_move = []
+
+    # Filter projects to create, including the new projects of moved tasks
     print('\nFiltering projects to create...')
     projects_from_tasks = set([(task['project_id'], task['parent_crumbs'][1]) for task in non_existing_tasks])
-    projects_to_create = [(id, name) for id, name in projects_from_tasks if id not in existing_project_ids]
+    projects_from_tasks.update([(project_id, liquid_planner_projects[project_id]) for _, project_id in tasks_to_move])
+    projects_to_create = [(id, name) for id, name in projects_from_tasks if len(entity_index.get_projects_by_liquid_planner_id(id)) == 0]
     
     # Create new projects and refresh list
     if len(projects_to_create) > 0:
         confirm_and_create_projects(projects_to_create)
-        memtime_projects = query_projects()
+        entity_index.set_projects(query_projects())
     else:
         print('No new projects to create')
 
     # Map tasks to MemTime project
     print('\nFiltering tasks to create...')
-    tasks_to_create = map_tasks_to_memtime_project(non_existing_tasks, memtime_projects)
+    tasks_to_create = map_tasks_to_memtime_project(non_existing_tasks, entity_index)
+    unsynced_task_ids.update(set(task['id'] for task in non_existing_tasks) - set(task['id'] for task, _ in tasks_to_create))
     
     # Create new tasks
     if len(tasks_to_create) > 0:
@@ -164,26 +220,52 @@ def main():
         print('No new tasks to create')
 
     # Set projects back to active if archived
-    projects_to_set_active: List[Project] = []
-    for _, project in tasks_to_create:
+    projects_to_set_active: Dict[int, Project] = {}
+    destination_projects = [entity_index.get_projects_by_liquid_planner_id(project_id)[0] for _, project_id in tasks_to_move]
+    for project in [project for _, project in tasks_to_create] + destination_projects:
         # Check active and prevent duplicates
-        if not project.is_active and project.id not in [project.id for project in projects_to_set_active]:
-            projects_to_set_active.append(project)
+        if not project.is_active:
+            projects_to_set_active[project.id] = project
 
     if len(projects_to_set_active) > 0:
         print()
-        for memtime_project in projects_to_set_active:
-            set_entity_is_active(memtime_project.id, True)
+        set_entities_is_active(list(projects_to_set_active.keys()), True)
+        for memtime_project in projects_to_set_active.values():
             print(f'Project "{memtime_project.label}" reactivated')
+        record_result('reactivated_projects', [project.label for project in projects_to_set_active.values()])
     
     # Set tasks back to active if archived
     if len(tasks_to_set_active) > 0:
         print()
+        set_entities_is_active([task.id for task in tasks_to_set_active], True)
         for memtime_task in tasks_to_set_active:
-            set_entity_is_active(memtime_task.id, True)
             print(f'Task "{memtime_task.label}" reactivated')
-    
-    # TODO: Update project name if different?
+        record_result('reactivated_tasks', [task.label for task in tasks_to_set_active])
+
+    # Move tasks whose LiquidPlanner project has changed
+    if len(tasks_to_move) > 0:
+        moves: List[Tuple[Task, Project]] = [(memtime_task, project) for (memtime_task, _), project in zip(tasks_to_move, destination_projects)]
+        set_entity_parents([(task.id, project.id) for task, project in moves])
+        record_result('moved_tasks', [{'task': task.label, 'from': entity_index.get_project(task.parent_id).label, 'to': project.label} for task, project in moves])
+        print()
+        for task, project in moves:
+            print(f'Task "{task.label}" moved to "{project.label}"')
+
+    # Rename projects if name is different
+    projects_to_rename: List[Tuple[Project, str]] = [(project, name) for id, name in changed_projects.items()
+                                                     for project in entity_index.get_projects_by_liquid_planner_id(id) if project.label != name]
+    if len(projects_to_rename) > 0:
+        print('\nProjects to rename:')
+        for memtime_project, name in projects_to_rename:
+            print(f'\t{memtime_project.label} ---> {name}')
+
+        print()
+        rename_projects = ask_question('Do you want to rename the above projects?', answer_key=RENAME_ANSWER_KEY)
+        if rename_projects:
+            set_entity_names([(project.id, name) for project, name in projects_to_rename])
+            record_result('renamed_projects', [{'from': project.label, 'to': name} for project, name in projects_to_rename])
+        else:
+            unsynced_project_ids.update([project.liquid_planner_id for project, _ in projects_to_rename])
 
     # Rename tasks if name is different
     if len(tasks_to_rename) > 0:
@@ -192,12 +274,32 @@ def main():
             print(f'\t{memtime_task.get_print_summary(False)}')
         
         print()
-        rename_tasks = ask_question('Do you want to rename the above tasks?')
+        rename_tasks = ask_question('Do you want to rename the above tasks?', answer_key=RENAME_ANSWER_KEY)
         if rename_tasks:
-            for memtime_task in tasks_to_rename:
-                set_entity_name(memtime_task.id, memtime_task.liquid_planner_name)
+            set_entity_names([(task.id, task.liquid_planner_name) for task in tasks_to_rename])
+            record_result('renamed_tasks', [{'from': task.label, 'to': task.liquid_planner_name} for task in tasks_to_rename])
+        else:
+            unsynced_task_ids.update([task.liquid_planner_id for task in tasks_to_rename])
 
+    # Record what is now in sync, including the MemTime entities as changed by this run
+    sync_state.record(
+        [task for task in project_tasks if task['id'] not in unsynced_task_ids],
+        {id: name for id, name in liquid_planner_projects.items() if id not in unsynced_project_ids},
+        member_id,
+        EntityIndex(query_tasks(), query_projects())
+    )
+    save_sync_state(sync_state)
 
 if __name__ == '__main__':
-    main()
-    exit(0)
+    parser = build_parser('Create MemTime projects and tasks from upcoming LiquidPlanner tasks.', READ_MODE_READONLY)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_UPCOMING_TASKS_PAGE_SIZE,
+                        help='Number of upcoming tasks to request from LiquidPlanner at a time.')
+    parser.add_argument('--rename', action=argparse.BooleanOptionalAction, default=None,
+                        help='Rename MemTime tasks and projects whose name differs from LiquidPlanner. Defaults to renaming with --yes, otherwise asks.')
+    parser.add_argument('--move', action=argparse.BooleanOptionalAction, default=None,
+                        help='Move MemTime tasks whose LiquidPlanner project has changed. Defaults to moving with --yes, otherwise asks.')
+    args = parser.parse_args()
+    apply_arguments(args)
+    set_answer(RENAME_ANSWER_KEY, (True if args.yes else None) if args.rename is None else args.rename)
+    set_answer(MOVE_ANSWER_KEY, (True if args.yes else None) if args.move is None else args.move)
+    run_script(args, lambda: main(args.page_size))
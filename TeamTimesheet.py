@@ -0,0 +1,133 @@
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from typing import List
+
+import Timesheet
+from utils.LiquidPlanner import LiquidPlannerClient, set_client, API_URL, WORKSPACE_ID
+from utils.MemTime import open_database, READ_MODE_SNAPSHOT
+from utils.TaskCache import TaskCache, set_task_cache, CACHE_FILENAME
+from utils.Util import exit, get_result, get_state_path, set_answer, set_non_interactive, CONFIRM_ANSWER_KEY, EXIT_CODE_FAILURE, EXIT_CODE_PARTIAL_FAILURE, EXIT_CODE_SUCCESS, STATE_DIRECTORY_ENV
+
+
+TEAM_DIRECTORY = 'team'
+DEFAULT_PROCESS_COUNT = 4
+
+def get_user_password(user: dict) -> str:
+    # Passwords can be kept out of the manifest by naming an environment variable instead
+    if 'password_env' in user:
+        password = os.environ.get(user['password_env'])
+        if password is None:
+            raise ValueError(f'Environment variable {user["password_env"]} is not set')
+        return password
+    return user['password']
+
+def run_user(user: dict, team_directory: str, dates: List[datetime.datetime], skip_invalid: bool, shared_split: bool) -> dict:
+    """
+    Runs Timesheet.main for one manifest entry. Each user runs in a fresh process with their own state directory (identity,
+    ledger) and log file, while the LiquidPlanner task cache is shared by every user of the same workspace.
+    """
+    user_directory = os.path.join(team_directory, 'users', user['name'])
+    os.makedirs(user_directory, exist_ok=True)
+    os.environ[STATE_DIRECTORY_ENV] = user_directory
+
+    workspace_id = user.get('workspace_id', WORKSPACE_ID)
+    set_task_cache(TaskCache(os.path.join(team_directory, f'{workspace_id}-{CACHE_FILENAME}')))
+
+    set_non_interactive(True)
+    set_answer(CONFIRM_ANSWER_KEY, True)
+    set_answer(Timesheet.SKIP_INVALID_ANSWER_KEY, skip_invalid)
+    set_answer(Timesheet.SHARED_SPLIT_ANSWER_KEY, shared_split)
+    set_answer(Timesheet.RETRY_ANSWER_KEY, False)
+
+    log_path = os.path.join(user_directory, 'timesheet.log')
+    start_time = time.perf_counter()
+    with open(log_path, 'w') as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            client = LiquidPlannerClient(user['email'], get_user_password(user), workspace_id, user.get('api_url', API_URL))
+            with client, open_database(user['database'], READ_MODE_SNAPSHOT):
+                set_client(client)
+                exit_code = Timesheet.main(dates) or EXIT_CODE_SUCCESS
+        except SystemExit as error:
+            exit_code = error.code if isinstance(error.code, int) else EXIT_CODE_FAILURE
+        except Exception as error:
+            traceback.print_exc(file=log_file)
+            get_result()['error'] = str(error) or type(error).__name__
+            exit_code = EXIT_CODE_FAILURE
+
+    return {
+        'name': user['name'],
+        'exit_code': exit_code,
+        'duration_secs': round(time.perf_counter() - start_time, 3),
+        'log': log_path,
+        **get_result()
+    }
+
+def run_user_safely(arguments: tuple) -> dict:
+    user = arguments[0]
+    try:
+        return run_user(*arguments)
+    except Exception as error:
+        return {'name': user.get('name'), 'exit_code': EXIT_CODE_FAILURE, 'duration_secs': 0.0, 'error': str(error) or type(error).__name__}
+
+def print_team_report(results: List[dict], duration_secs: float):
+    print(f'\nProcessed {len(results)} user(s) in {round(duration_secs, 2)}s:')
+    for result in results:
+        submissions = result.get('submissions', [])
+        posted_count = len([submission for submission in submissions if submission['status'] == 'posted'])
+        status = {EXIT_CODE_SUCCESS: 'OK', EXIT_CODE_PARTIAL_FAILURE: 'PARTIAL'}.get(result['exit_code'], 'FAILED')
+        print(f'\t{status.ljust(7)} | {str(result["name"]).ljust(20)} | {str(result.get("total_hrs", 0)).ljust(6)} hrs | '
+              f'{posted_count}/{len(submissions)} entries | {result["duration_secs"]}s')
+        if 'error' in result:
+            print(f'\t\tERROR: {result["error"]}')
+
+def main(manifest_path: str, dates: List[datetime.datetime], process_count: int, skip_invalid: bool, shared_split: bool) -> List[dict]:
+    with open(manifest_path) as manifest_file:
+        users: List[dict] = json.load(manifest_file)['users']
+
+    names = [user['name'] for user in users]
+    if len(set(names)) != len(names):
+        raise ValueError('Every user in the manifest must have a unique name')
+
+    team_directory = get_state_path(TEAM_DIRECTORY)
+    print(f'Timesheeting {len(users)} user(s) for {", ".join([date.strftime("%d/%m/%Y") for date in dates])}')
+
+    # Each process serves a single user so no connection, credential or module state leaks between users
+    start_time = time.perf_counter()
+    arguments = [(user, team_directory, dates, skip_invalid, shared_split) for user in users]
+    with multiprocessing.Pool(min(process_count, len(users)) or 1, maxtasksperchild=1) as pool:
+        results = pool.map(run_user_safely, arguments, chunksize=1)
+
+    print_team_report(results, time.perf_counter() - start_time)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Log MemTime time entries to LiquidPlanner for every user in a team manifest.')
+    parser.add_argument('manifest', help='JSON file with a "users" list of {name, database, email, password or password_env, workspace_id}.')
+    parser.add_argument('--processes', type=int, default=DEFAULT_PROCESS_COUNT, help='Number of users to process at once.')
+    date_group = parser.add_mutually_exclusive_group()
+    date_group.add_argument('--date', type=Timesheet.parse_date, metavar='DD/MM/YYYY', help='Date to log. Defaults to today.')
+    date_group.add_argument('--from', dest='from_date', type=Timesheet.parse_date, metavar='DD/MM/YYYY', help='First date of a range to log.')
+    date_group.add_argument('--week', action='store_true', help='Log every day from Monday of the current week until today.')
+    parser.add_argument('--to', dest='to_date', type=Timesheet.parse_date, metavar='DD/MM/YYYY', help='Last date of the range (inclusive), used with --from. Defaults to today.')
+    parser.add_argument('--skip-invalid', action='store_true', help='Skip tasks without a valid LiquidPlanner ID instead of failing the user.')
+    parser.add_argument('--shared-split', choices=['spl', 'man'], default='man',
+                        help='Split shared time across remaining tasks (spl) or across all tasks (man).')
+    parser.add_argument('--json', metavar='PATH', help='Also write the consolidated report to a JSON file.')
+    args = parser.parse_args()
+    Timesheet.check_date_arguments(parser, args)
+
+    set_non_interactive(True)
+    results = main(args.manifest, Timesheet.get_dates(args), args.processes, args.skip_invalid, args.shared_split == 'spl')
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(results, report_file, indent=2)
+
+    failed = any([result['exit_code'] != EXIT_CODE_SUCCESS for result in results])
+    exit(EXIT_CODE_PARTIAL_FAILURE if failed else EXIT_CODE_SUCCESS)
@@ -1,44 +1,84 @@
+import argparse
 import datetime
-import tzlocal
-from typing import List
+from typing import Dict, List, Union
 
+from models.EntityIndex import EntityIndex
 from models.Task import Task
-from utils.MemTime import query_time_entries, query_projects, query_tasks, SHARED_TIME_NAME
-from utils.LiquidPlanner import fetch_my_account, fetch_member, fetch_tasks_by_ids, post_timesheet_entry
-from utils.Util import ask_question, get_epoch_from_datetime, exit
+from models.TimesheetDay import TimesheetDay
+from models.TimesheetSubmission import TimesheetSubmission
+from utils.MemTime import query_daily_time_totals, query_projects, query_tasks, READ_MODE_SNAPSHOT, SHARED_TIME_NAME
+from utils.IdentityCache import fetch_cached_identity
+from utils.TaskCache import fetch_cached_tasks_by_ids
+from utils.Submission import submit_timesheet_entries, print_submission_report
+from utils.SubmissionLedger import SubmissionLedger, get_ledger_key, get_submission_ledger
+from utils.Cli import build_parser, apply_arguments, run_script
+from utils.Util import ask_question, get_epoch_from_datetime, get_local_timezone, exit, is_non_interactive, record_result, run_in_background, set_answer, EXIT_CODE_FAILURE, EXIT_CODE_PARTIAL_FAILURE, EXIT_CODE_SUCCESS
 
 
 LOW_REMAINING_TIME_WARNING_HRS = 0.5
-SECONDS_IN_DAY = 60 * 60 * 24
+DATE_FORMAT = '%d/%m/%Y'
+
+SKIP_INVALID_ANSWER_KEY = 'skip_invalid'
+SHARED_SPLIT_ANSWER_KEY = 'shared_split'
+RETRY_ANSWER_KEY = 'retry'
+DEFAULT_MAX_RETRY_ROUNDS = 3
+
+def parse_date(date_str: str) -> datetime.datetime:
+    return datetime.datetime.strptime(date_str, DATE_FORMAT)
+
+def get_today() -> datetime.datetime:
+    return datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
 def get_date_input() -> datetime.datetime:
     while True:
         date_str = input('Enter date or press enter for today [dd/mm/yyyy]: ')
         if date_str == '':
-            date = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            date = get_today()
         else:
             try:
-                date = datetime.datetime.strptime(date_str, '%d/%m/%Y')
+                date = parse_date(date_str)
             except ValueError:
                 print('Invalid date format. Please try again.')
                 continue
-        
+
         while True:
-            confirm = input(f'Confirm date "{date.strftime("%d/%m/%Y")}" [y/n]: ').lower()
+            confirm = input(f'Confirm date "{date.strftime(DATE_FORMAT)}" [y/n]: ').lower()
             if confirm == 'y':
                 return date
             elif confirm == 'n':
                 break
 
-def main():
-    # Get date to log timesheet
-    date = get_date_input()
-    start_epoch = get_epoch_from_datetime(date)
-    end_epoch = start_epoch + SECONDS_IN_DAY
+def get_date_range(from_date: datetime.datetime, to_date: datetime.datetime) -> List[datetime.datetime]:
+    days = (to_date - from_date).days
+    return [from_date + datetime.timedelta(days=day) for day in range(days + 1)]
 
-    # Fetch timesheet entries from database
-    timesheet_entries = query_time_entries(start_epoch, end_epoch)
-    entity_ids = list(set(entry.entity_id for entry in timesheet_entries))
+def check_date_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    # --date, --from and --week are mutually exclusive in the parser, but --to only has a meaning alongside --from
+    if args.to_date is not None and args.from_date is None:
+        parser.error('argument --to: only allowed with argument --from')
+
+def get_dates(args) -> List[datetime.datetime]:
+    if args.week:
+        today = get_today()
+        return get_date_range(today - datetime.timedelta(days=today.weekday()), today)
+    elif args.date is not None:
+        return [args.date]
+    elif args.from_date is not None:
+        to_date = args.to_date or get_today()
+        if to_date < args.from_date:
+            print('ERROR: --to date must not be before --from date')
+            exit(EXIT_CODE_FAILURE)
+        return get_date_range(args.from_date, to_date)
+    elif is_non_interactive():
+        return [get_today()]
+    else:
+        return [get_date_input()]
+
+def build_timesheet_days(dates: List[datetime.datetime]) -> List[TimesheetDay]:
+    # Fetch logged time per task for every day with a single database query
+    day_ranges = [(get_epoch_from_datetime(date), get_epoch_from_datetime(date + datetime.timedelta(days=1))) for date in dates]
+    daily_time_totals = query_daily_time_totals(day_ranges)
+    entity_ids = list(set(entity_id for time_totals in daily_time_totals.values() for entity_id in time_totals))
 
     # Fetch shared time project
     if len(SHARED_TIME_NAME) == 0:
@@ -51,138 +91,242 @@ def main():
             shared_time_project = None
 
     # Fetch tasks from database and validate all time entries can be mapped
-    tasks = query_tasks(entity_ids)
-    memtime_task_ids = [task.id for task in tasks]
-    for entry in timesheet_entries:
-        try:
-            task_index = memtime_task_ids.index(entry.entity_id)
-            tasks[task_index].add_entry(entry)
-        except ValueError:
-            print(f'ERROR: Failed to query a MemTime task for timesheet entry "{entry}"')
-            exit(1)
-    
-    # Create task lists based on if they are shared time tasks and they have valid LP IDs
-    tasks_to_timesheet: List[Task] = []
-    invalid_tasks: List[Task] = []
-
-    for task in tasks:
-        if shared_time_project != None and task.parent_id == shared_time_project.id:
-            shared_time_project.add_task(task)
-        elif task.liquid_planner_id == None:
-            invalid_tasks.append(task)
-        else:
-            tasks_to_timesheet.append(task)
-    
+    entity_index = EntityIndex(query_tasks(entity_ids))
+
+    timesheet_days: List[TimesheetDay] = []
+    for date, (start_epoch, _) in zip(dates, day_ranges):
+        time_totals = daily_time_totals[start_epoch]
+        if len(time_totals) == 0:
+            continue
+
+        day_tasks: List[Task] = []
+        for entity_id, time_secs in time_totals.items():
+            task = entity_index.get_task(entity_id)
+            if task is None:
+                print(f'ERROR: Failed to query a MemTime task for timesheet entries logged against entity {entity_id}')
+                exit(EXIT_CODE_FAILURE)
+
+            # Each day holds its own copy of the task so time and multipliers are kept per day
+            day_task = task.copy_without_time()
+            day_task.add_aggregated_time(time_secs)
+            day_tasks.append(day_task)
+
+        day_shared_time_project = None if shared_time_project is None else shared_time_project.copy_without_tasks()
+        timesheet_days.append(TimesheetDay(date, day_tasks, day_shared_time_project))
+
+    return timesheet_days
+
+def print_day_summary(day: TimesheetDay, log_invalid_tasks_manually: bool):
+    # Print total daily time
+    print(f'\nTotal Task Time: {round(day.total_time, 2)} hrs')
+
+    # If user has selected to log tasks manually, print valid task total of what is being logged by script
+    if len(day.invalid_tasks) > 0 and log_invalid_tasks_manually:
+        invalid_task_time = day.get_invalid_task_time()
+        valid_task_time = day.total_time - invalid_task_time
+        print(f'\nValid Timesheet Tasks: {round(valid_task_time, 2)} hrs')
+
+    # Print task summary
+    for task in day.tasks_to_timesheet:
+        print(f'\t{task.get_print_summary_with_time(day.shared_time_multiplier, False)}')
+
+    # If user has selected to log tasks manually, print invalid task total and list
+    if len(day.invalid_tasks) > 0 and log_invalid_tasks_manually:
+        print(f'\nTasks To Manually Timesheet: {round(invalid_task_time, 2)} hrs')
+        for task in day.invalid_tasks:
+            print(f'\t{task.get_print_summary_with_time(day.shared_time_multiplier, True)}')
+
+    # Print shared time summary if time logged
+    if day.total_shared_project_time > 0:
+        print(f'\nShared Time Tasks: {round(day.total_shared_project_time, 2)} hrs ({round(day.shared_time_multiplier, 2)}x task multiplier)')
+        for task in day.shared_time_project.tasks:
+            # Shared time multiplier should not be applied to these tasks
+            print(f'\t{task.get_print_summary_with_time(1, True)}')
+
+def build_submissions(timesheet_days: List[TimesheetDay], default_activity_id: int, ledger: Union[SubmissionLedger, None]) -> List[TimesheetSubmission]:
+    # Remaining effort is reduced by the time logged on earlier days in the range
+    local_timezone = get_local_timezone()
+    submissions: List[TimesheetSubmission] = []
+    logged_time_by_lp_task: Dict[int, float] = {}
+    already_posted_count = 0
+    for day in timesheet_days:
+        post_dt_tz = day.get_post_datetime(local_timezone)
+
+        for task in day.tasks_to_timesheet:
+            logged_time_hrs = round(task.get_logged_time_hrs() * day.shared_time_multiplier, 2)
+
+            # Only the difference from what an earlier run already posted for this day and task is submitted
+            if ledger is not None:
+                posted_time_hrs = ledger.get_posted_work(get_ledger_key(day.date, task.id, task.liquid_planner_id))
+                if round(logged_time_hrs - posted_time_hrs, 2) < 0:
+                    print(f'WARNING: {posted_time_hrs} hrs were already submitted for "{task.label}" on {day.date.strftime(DATE_FORMAT)}, '
+                          f'{round(posted_time_hrs - logged_time_hrs, 2)} hrs more than logged now. Correct this manually in LiquidPlanner.')
+                logged_time_hrs = round(logged_time_hrs - posted_time_hrs, 2)
+                if logged_time_hrs <= 0:
+                    already_posted_count += 1
+                    continue
+
+            previously_logged_hrs = logged_time_by_lp_task.get(task.liquid_planner_id, 0.0)
+            logged_time_by_lp_task[task.liquid_planner_id] = previously_logged_hrs + logged_time_hrs
+            activity_id = task.liquid_planner_activity_id or default_activity_id
+            body = {
+                'work': logged_time_hrs,
+                'activity_id': activity_id,
+                'low': max(task.liquid_planner_remaining_low - previously_logged_hrs - logged_time_hrs, 0),
+                'high': max(task.liquid_planner_remaining_high - previously_logged_hrs - logged_time_hrs, 0),
+                'work_performed_on': post_dt_tz.isoformat()
+            }
+            submissions.append(TimesheetSubmission(day.date, task.id, task.liquid_planner_id, task.label, body))
+
+    if already_posted_count > 0:
+        print(f'\nSkipping {already_posted_count} entries which were already submitted')
+    return submissions
+
+def print_remaining_time_warnings(submissions: List[TimesheetSubmission], tasks: List[Task]):
+    # Effort remaining is fetched fresh and already excludes time posted by earlier runs, so only the time about to be
+    # submitted is taken from it
+    remaining_high_by_lp_task: Dict[int, float] = {task.liquid_planner_id: task.liquid_planner_remaining_high for task in tasks}
+    submitted_time_by_lp_task: Dict[int, float] = {}
+    labels_by_lp_task: Dict[int, str] = {}
+    for submission in submissions:
+        submitted_time_by_lp_task[submission.liquid_planner_id] = submitted_time_by_lp_task.get(submission.liquid_planner_id, 0.0) + submission.body['work']
+        labels_by_lp_task[submission.liquid_planner_id] = submission.label
+
+    for lp_task_id, submitted_time_hrs in submitted_time_by_lp_task.items():
+        remaining_time_hrs = round(remaining_high_by_lp_task[lp_task_id] - submitted_time_hrs, 2)
+        if remaining_time_hrs <= LOW_REMAINING_TIME_WARNING_HRS:
+            print(f'WARNING: "{labels_by_lp_task[lp_task_id]}" has {remaining_time_hrs} hrs remaining')
+
+def main(dates: List[datetime.datetime], use_ledger: bool = True, max_retry_rounds: int = DEFAULT_MAX_RETRY_ROUNDS) -> int:
+    # The member and default activity do not depend on MemTime, so they are requested while time is read
+    identity_future = run_in_background(fetch_cached_identity, include_default_activity=True)
+
+    # Read time for each date to log
+    record_result('dates', [date.strftime('%Y-%m-%d') for date in dates])
+    timesheet_days = build_timesheet_days(dates)
+    if len(timesheet_days) == 0:
+        print('No time logged for the selected date(s)')
+        return EXIT_CODE_SUCCESS
+
+    # Tasks are requested as soon as their IDs are known, and fetched while any questions below are answered
+    tasks_to_timesheet: List[Task] = [task for day in timesheet_days for task in day.tasks_to_timesheet]
+    liquid_planner_task_ids = list(set(task.liquid_planner_id for task in tasks_to_timesheet))
+    # Effort remaining is always fetched fresh as it is used to calculate the remaining time posted
+    tasks_json_future = run_in_background(fetch_cached_tasks_by_ids, liquid_planner_task_ids, ['parent_crumbs', 'name', 'assignments'], {'assignments': 0})
+
     # Confirm user wants to proceed with tasks with no LP URL
-    invalid_task_ids = [task.id for task in invalid_tasks]
-    shared_time_total_tasks: List[Task] = tasks
+    invalid_tasks: Dict[int, Task] = {task.id: task for day in timesheet_days for task in day.invalid_tasks}
+    shared_time_on_remaining_tasks = False
 
+    record_result('invalid_tasks', [task.label for task in invalid_tasks.values()])
     if len(invalid_tasks) > 0:
         print('The tasks below do not have a valid LiquidPlanner ID associated with them:')
-        for task in invalid_tasks:
+        for task in invalid_tasks.values():
             print(f'\t{task.label}')
 
         print()
-        confirmed = ask_question(f'Do you want to skip timesheeting the above task(s)?')
+        confirmed = ask_question(f'Do you want to skip timesheeting the above task(s)?', answer_key=SKIP_INVALID_ANSWER_KEY)
         if not confirmed:
             print('Cancelled')
-            exit(1)
-        
-        shared_time_on_remaining_tasks = ask_question(f'Do you want to split shared time across the remaining tasks, or will you timesheet the above tasks manually?', 'spl', 'man')
-        if shared_time_on_remaining_tasks:
-            shared_time_total_tasks: List[Task] = [task for task in tasks if task.id not in invalid_task_ids]
-    
+            exit(EXIT_CODE_FAILURE)
+
+        shared_time_on_remaining_tasks = ask_question(f'Do you want to split shared time across the remaining tasks, or will you timesheet the above tasks manually?', 'spl', 'man', SHARED_SPLIT_ANSWER_KEY)
+
     # Get default activity information
-    user_account: dict = fetch_my_account()
-    member_id: int = user_account['id']
-    member: dict = fetch_member(member_id)
-    default_activity_id: int = member['default_activity_id']
+    identity: dict = identity_future.result()
+    member_id: int = identity['id']
+    default_activity_id: int = identity['default_activity_id']
 
-    # Fetch, validate and map LiquidPlanner tasks
-    liquid_planner_task_ids = [task.liquid_planner_id for task in tasks_to_timesheet]
-    tasks_json = fetch_tasks_by_ids(liquid_planner_task_ids)
+    # Validate and map LiquidPlanner tasks for every day at once
+    tasks_json = tasks_json_future.result()
 
-    lp_task_ids = [task['id'] for task in tasks_json]
+    tasks_json_by_id: Dict[int, dict] = {task_json['id']: task_json for task_json in tasks_json}
     for task in tasks_to_timesheet:
-        try:
-            lp_task_index = lp_task_ids.index(task.liquid_planner_id)
-        except ValueError:
+        task_json = tasks_json_by_id.get(task.liquid_planner_id)
+        if task_json is None:
             print(f'ERROR: Could not find LiquidPlanner task for "{task.label}"')
             # TODO: Do we want to add this to invalid tasks?
-            exit(1)
+            exit(EXIT_CODE_FAILURE)
 
         # This will be set on task objects in all lists as lists contain same object references
-        task.set_liquid_planner_task(tasks_json[lp_task_index], member_id)
-     
-    # Calculate and set shared time multiplier
-    total_time = sum([task.get_logged_time_hrs() for task in shared_time_total_tasks])
-    total_shared_project_time = 0 if shared_time_project is None else shared_time_project.get_total_task_time()
-    shared_time_multiplier = total_time / (total_time - total_shared_project_time)
-    
-    # Print total daily time
-    print(f'\nTotal Task Time: {round(total_time, 2)} hrs')
+        task.set_liquid_planner_task(task_json, member_id)
 
-    # If user has selected to log tasks manually, print valid task total of what is being logged by script
-    if len(invalid_tasks) > 0 and not shared_time_on_remaining_tasks:
-        invalid_task_time = sum([task.get_logged_time_hrs() for task in invalid_tasks]) * shared_time_multiplier
-        valid_task_time = total_time - invalid_task_time
-        print(f'\nValid Timesheet Tasks: {round(valid_task_time, 2)} hrs')
+    # Calculate and set shared time multiplier, then print each day
+    for day in timesheet_days:
+        day.set_shared_time_multiplier(shared_time_on_remaining_tasks)
+        if len(timesheet_days) > 1:
+            print(f'\n===== {day.date.strftime("%A")} {day.date.strftime(DATE_FORMAT)} =====')
+        print_day_summary(day, not shared_time_on_remaining_tasks)
 
-    # Print task summary
-    for task in tasks_to_timesheet:
-        print(f'\t{task.get_print_summary_with_time(shared_time_multiplier, False)}')
+    record_result('total_hrs', round(sum([day.total_time for day in timesheet_days]), 2))
+    if len(timesheet_days) > 1:
+        print(f'\nTotal Time Across {len(timesheet_days)} Days: {round(sum([day.total_time for day in timesheet_days]), 2)} hrs')
 
-    # If user has selected to log tasks manually, print invalid task total and list
-    if len(invalid_tasks) > 0 and not shared_time_on_remaining_tasks:
-        print(f'\nTasks To Manually Timesheet: {round(invalid_task_time, 2)} hrs')
-        for task in invalid_tasks:
-            print(f'\t{task.get_print_summary_with_time(shared_time_multiplier, True)}')
-    
-    # Print shared time summary if time logged
-    if total_shared_project_time > 0:
-        print(f'\nShared Time Tasks: {round(total_shared_project_time, 2)} hrs ({round(shared_time_multiplier, 2)}x task multiplier)')
-        for task in shared_time_project.tasks:
-            # Shared time multiplier should not be applied to these tasks
-            print(f'\t{task.get_print_summary_with_time(1, True)}')
-    
-    # Print warnings regarding tasks which have no remaining time
     print()
-    for task in tasks_to_timesheet:
-        logged_time_hrs = task.get_logged_time_hrs() * shared_time_multiplier
-        remaining_time_hrs = round(task.liquid_planner_remaining_high - logged_time_hrs, 2)
-        if remaining_time_hrs <= LOW_REMAINING_TIME_WARNING_HRS:
-            print(f'WARNING: "{task.label}" has {remaining_time_hrs} hrs remaining')
+
+    # Successful posts are always recorded, even when earlier submissions are ignored
+    ledger = get_submission_ledger()
+    submissions = build_submissions(timesheet_days, default_activity_id, ledger if use_ledger else None)
+    if len(submissions) == 0:
+        print('Nothing new to submit')
+        record_result('submissions', [])
+        return EXIT_CODE_SUCCESS
+
+    print_remaining_time_warnings(submissions, tasks_to_timesheet)
 
     # Get confirmation of log output before logging to LiquidPlanner
     print()
     confirmed = ask_question('Confirm you want to submit your timesheet as shown above?')
     if not confirmed:
         print('Cancelled')
-        exit(1)
-    
-    # Save to LiquidPlanner
-    post_dt = date.replace(hour=17)
-    now = datetime.datetime.now()
-    if now < post_dt:
-        post_dt = now
-    post_dt_tz = post_dt.replace(microsecond=0).astimezone(tzlocal.get_localzone())
+        exit(EXIT_CODE_FAILURE)
 
-    for task in tasks_to_timesheet:
-        logged_time_hrs = round(task.get_logged_time_hrs() * shared_time_multiplier, 2)
-        activity_id = task.liquid_planner_activity_id or default_activity_id
-        body = {
-            'work': logged_time_hrs,
-            'activity_id': activity_id,
-            'low': max(task.liquid_planner_remaining_low - logged_time_hrs, 0),
-            'high': max(task.liquid_planner_remaining_high - logged_time_hrs, 0),
-            'work_performed_on': post_dt_tz.isoformat()
-        }
-
-        try:
-            post_timesheet_entry(task.liquid_planner_id, body)
-        except Exception:
-            print(f'ERROR: Failed to upload timesheet entry for "{task.label}"')
+    # Save to LiquidPlanner, retrying only the entries which were throttled or could not connect if requested. Rounds
+    # are capped so an unattended run never keeps posting entries which will not succeed.
+    retry_round = 0
+    while True:
+        submit_timesheet_entries(submissions, ledger=ledger)
+        print_submission_report(submissions)
+
+        failed_count = len([submission for submission in submissions if not submission.is_posted()])
+        retryable_count = len([submission for submission in submissions if submission.is_retryable()])
+        if retryable_count < failed_count:
+            print(f'\n{failed_count - retryable_count} entries were not retried as they were rejected or may already have been recorded. '
+                  'Check them in LiquidPlanner before running again.')
+        if retryable_count == 0 or retry_round >= max_retry_rounds:
+            break
+        if not ask_question(f'\nDo you want to retry the {retryable_count} entries which were throttled or could not connect?', answer_key=RETRY_ANSWER_KEY):
+            break
+        retry_round += 1
+
+    record_result('submissions', [submission.to_dict() for submission in submissions])
+    return EXIT_CODE_SUCCESS if failed_count == 0 else EXIT_CODE_PARTIAL_FAILURE
 
 if __name__ == '__main__':
-    main()
-    exit(0)
+    parser = build_parser('Log MemTime time entries to LiquidPlanner.', READ_MODE_SNAPSHOT)
+    date_group = parser.add_mutually_exclusive_group()
+    date_group.add_argument('--date', type=parse_date, metavar='DD/MM/YYYY',
+                            help='Date to log. Defaults to prompting, or today when running non-interactively.')
+    date_group.add_argument('--from', dest='from_date', type=parse_date, metavar='DD/MM/YYYY',
+                            help='First date of a range to log in one run.')
+    date_group.add_argument('--week', action='store_true',
+                            help='Log every day from Monday of the current week until today.')
+    parser.add_argument('--to', dest='to_date', type=parse_date, metavar='DD/MM/YYYY',
+                        help='Last date of the range (inclusive), used with --from. Defaults to today.')
+    parser.add_argument('--skip-invalid', action='store_true',
+                        help='Skip tasks without a valid LiquidPlanner ID instead of cancelling.')
+    parser.add_argument('--shared-split', choices=['spl', 'man'],
+                        help='Split shared time across remaining tasks (spl) or across all tasks, timesheeting invalid tasks manually (man).')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Retry entries which were throttled or could not connect, and so were not recorded, instead of stopping.')
+    parser.add_argument('--max-retry-rounds', type=int, default=DEFAULT_MAX_RETRY_ROUNDS, metavar='N',
+                        help=f'Most times failed entries are retried in one run. Defaults to {DEFAULT_MAX_RETRY_ROUNDS}.')
+    parser.add_argument('--ignore-ledger', action='store_true',
+                        help='Submit all logged time, even if earlier runs already submitted it for the same dates.')
+    args = parser.parse_args()
+    check_date_arguments(parser, args)
+    apply_arguments(args)
+    set_answer(SKIP_INVALID_ANSWER_KEY, True if args.skip_invalid or args.yes else None)
+    set_answer(SHARED_SPLIT_ANSWER_KEY, None if args.shared_split is None else args.shared_split == 'spl')
+    set_answer(RETRY_ANSWER_KEY, args.retry_failed)
+    run_script(args, lambda: main(get_dates(args), not args.ignore_ledger, args.max_retry_rounds))
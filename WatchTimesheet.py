@@ -0,0 +1,249 @@
+import datetime
+import time
+from typing import Dict, List
+
+from models.EntityIndex import EntityIndex
+from models.TimesheetSubmission import TimesheetSubmission
+from utils.MemTime import get_database, query_projects, query_tasks, query_time_entry_durations_ended_after, READ_MODE_READONLY, SHARED_TIME_NAME
+from utils.IdentityCache import fetch_cached_identity
+from utils.TaskCache import fetch_cached_tasks_by_ids
+from utils.Submission import submit_timesheet_entries, print_submission_report
+from utils.SubmissionLedger import SubmissionLedger, get_ledger_key, get_submission_ledger
+from utils.Cli import build_parser, apply_arguments, run_script
+from utils.Util import get_epoch_from_datetime, get_local_timezone, load_state_json, record_result, save_state_json, EXIT_CODE_PARTIAL_FAILURE, EXIT_CODE_SUCCESS
+
+
+WATCH_STATE_FILENAME = 'watch_state.json'
+DEFAULT_POLL_INTERVAL_SECS = 60
+DEFAULT_PUSH_INTERVAL_SECS = 30 * 60
+# Entries which ended very recently are left for the next poll in case MemTime is still writing them
+SETTLE_SECS = 60
+# Entries are re-read for this long after they end, so edits made to them in that time are picked up
+REREAD_SECS = 24 * 60 * 60
+SECONDS_IN_HOUR = 60 * 60
+WORK_DECIMALS = 2
+
+def load_watch_state(database_path: str, since_epoch: int) -> dict:
+    """
+    Returns the persisted watermark and pending time for this database. A new state starts at since_epoch.
+    """
+    states: dict = load_state_json(WATCH_STATE_FILENAME, {})
+    state = states.get(database_path)
+    if state is None:
+        state = {'watermark': since_epoch, 'pending': {}, 'shared_pending': 0.0}
+    # Entries already counted, as rowid -> [entity ID, seconds counted, end epoch], and posts which may have been sent
+    state.setdefault('counted', {})
+    state.setdefault('in_flight', [])
+    return state
+
+def save_watch_state(database_path: str, state: dict):
+    states: dict = load_state_json(WATCH_STATE_FILENAME, {})
+    states[database_path] = state
+    save_state_json(WATCH_STATE_FILENAME, states)
+
+def poll(state: dict) -> int:
+    """
+    Adds the time of every entry which ended since the watermark to the pending time, then advances the watermark.
+    Entries already counted are compared with what was counted for them, so an edited, moved or deleted entry only
+    changes the pending time by the difference. Returns the number of tasks whose time changed.
+    """
+    cutoff_epoch = get_epoch_from_datetime() - SETTLE_SECS
+    watermark = state['watermark']
+    reread_epoch = min(watermark, cutoff_epoch) - REREAD_SECS
+
+    pending: Dict[str, float] = state['pending']
+    counted: Dict[str, list] = state['counted']
+    updated_entity_ids = set()
+
+    def add_time(entity_id: int, time_secs: int):
+        pending[str(entity_id)] = pending.get(str(entity_id), 0.0) + time_secs
+        updated_entity_ids.add(entity_id)
+
+    read_rowids = set()
+    for rowid, entity_id, end_epoch, time_secs in query_time_entry_durations_ended_after(reread_epoch):
+        read_rowids.add(str(rowid))
+        counted_entry = counted.get(str(rowid))
+        if counted_entry is None:
+            # New entries are counted once they have settled past the watermark
+            if not watermark < end_epoch <= cutoff_epoch:
+                continue
+        elif counted_entry[0] == entity_id and counted_entry[1] == time_secs:
+            counted_entry[2] = end_epoch
+            continue
+        else:
+            add_time(counted_entry[0], -counted_entry[1])
+
+        add_time(entity_id, time_secs)
+        counted[str(rowid)] = [entity_id, time_secs, end_epoch]
+
+    # Counted entries which were not read again have either been deleted or are too old to be re-read
+    for rowid, (entity_id, time_secs, end_epoch) in list(counted.items()):
+        if rowid not in read_rowids:
+            if end_epoch > reread_epoch:
+                add_time(entity_id, -time_secs)
+            del counted[rowid]
+
+    state['watermark'] = max(watermark, cutoff_epoch)
+    return len(updated_entity_ids)
+
+def consume_posted_time(state: dict, ledger: SubmissionLedger):
+    """
+    Removes the time posted by the last push from the pending time, using the ledger rather than the push's results so
+    posts which succeeded before the watcher was stopped are never sent again.
+    """
+    pending: Dict[str, float] = state['pending']
+    for post in state['in_flight']:
+        work_hrs = round(ledger.get_posted_work(tuple(post['key'])) - post['posted_before'], WORK_DECIMALS)
+        if work_hrs <= 0:
+            continue
+
+        # Only the posted share of task and shared time is consumed, so rounding never drifts
+        work_secs = work_hrs * SECONDS_IN_HOUR
+        task_secs = work_secs / post['shared_time_multiplier']
+        pending[str(post['memtime_task_id'])] = pending.get(str(post['memtime_task_id']), 0.0) - task_secs
+        state['shared_pending'] -= work_secs - task_secs
+
+    state['in_flight'] = []
+    for id in [id for id, time_secs in pending.items() if abs(time_secs) < 1]:
+        del pending[id]
+    state['shared_pending'] = max(state['shared_pending'], 0.0)
+
+def push(state: dict, database_path: str) -> bool:
+    """
+    Posts the pending time of each task to LiquidPlanner, spreading pending shared time across the posted tasks.
+    Posted time is removed from the pending time, keeping rounding remainders for the next push. Each post is recorded
+    in the submission ledger as it succeeds. Returns False if any post failed.
+    """
+    # Settle a push which was interrupted before its results were saved
+    ledger = get_submission_ledger()
+    consume_posted_time(state, ledger)
+
+    pending: Dict[str, float] = state['pending']
+    if len(pending) == 0:
+        return True
+
+    entity_index = EntityIndex(query_tasks([int(id) for id in pending.keys()]))
+    shared_time_projects = query_projects(SHARED_TIME_NAME) if len(SHARED_TIME_NAME) > 0 else []
+    shared_time_project_id = shared_time_projects[0].id if len(shared_time_projects) > 0 else None
+
+    # Move shared time into its own pending total and drop time which can never be posted
+    tasks_to_post = []
+    for id in list(pending.keys()):
+        task = entity_index.get_task(int(id))
+        if task is not None and shared_time_project_id is not None and task.parent_id == shared_time_project_id:
+            state['shared_pending'] += pending.pop(id)
+        elif task is None or task.liquid_planner_id is None:
+            label = f'entity {id}' if task is None else f'"{task.label}"'
+            dropped_secs = pending.pop(id)
+            if dropped_secs > 0:
+                print(f'WARNING: Dropping {round(dropped_secs / SECONDS_IN_HOUR, WORK_DECIMALS)} hrs logged against {label} as it has no LiquidPlanner ID')
+        elif pending[id] > 0:
+            # Time removed by edits is kept to offset the task's next entries
+            tasks_to_post.append(task)
+
+    total_task_secs = sum([pending[str(task.id)] for task in tasks_to_post])
+    if total_task_secs <= 0:
+        return True
+    shared_time_multiplier = (total_task_secs + state['shared_pending']) / total_task_secs
+
+    # Effort remaining is always fetched fresh as it is used to calculate the remaining time posted
+    identity = fetch_cached_identity(include_default_activity=True)
+    tasks_json = fetch_cached_tasks_by_ids([task.liquid_planner_id for task in tasks_to_post], ['assignments'], {'assignments': 0})
+    tasks_json_by_id = {task_json['id']: task_json for task_json in tasks_json}
+
+    now = datetime.datetime.now()
+    post_dt_tz = now.replace(microsecond=0).astimezone(get_local_timezone())
+    submissions: List[TimesheetSubmission] = []
+    for task in tasks_to_post:
+        task_json = tasks_json_by_id.get(task.liquid_planner_id)
+        if task_json is None:
+            print(f'WARNING: Could not find LiquidPlanner task for "{task.label}", its time will be retried next push')
+            continue
+
+        task.set_liquid_planner_task(task_json, identity['id'])
+        work_hrs = round(pending[str(task.id)] * shared_time_multiplier / SECONDS_IN_HOUR, WORK_DECIMALS)
+        if work_hrs <= 0:
+            continue
+
+        body = {
+            'work': work_hrs,
+            'activity_id': task.liquid_planner_activity_id or identity['default_activity_id'],
+            'low': max(task.liquid_planner_remaining_low - work_hrs, 0),
+            'high': max(task.liquid_planner_remaining_high - work_hrs, 0),
+            'work_performed_on': post_dt_tz.isoformat()
+        }
+        submissions.append(TimesheetSubmission(now, task.id, task.liquid_planner_id, task.label, body))
+
+    if len(submissions) == 0:
+        return True
+
+    # The ledger totals are saved before posting, so a restart can tell which posts went through
+    state['in_flight'] = []
+    for submission in submissions:
+        key = get_ledger_key(submission.date, submission.memtime_task_id, submission.liquid_planner_id)
+        state['in_flight'].append({
+            'memtime_task_id': submission.memtime_task_id,
+            'key': list(key),
+            'posted_before': ledger.get_posted_work(key),
+            'shared_time_multiplier': shared_time_multiplier
+        })
+    save_watch_state(database_path, state)
+
+    submit_timesheet_entries(submissions, ledger=ledger)
+    print_submission_report(submissions)
+    consume_posted_time(state, ledger)
+
+    return all([submission.is_posted() for submission in submissions])
+
+def main(poll_interval_secs: int, push_interval_secs: int, since: datetime.datetime, once: bool) -> int:
+    """
+    Polls MemTime for new time entries and periodically posts the accumulated time to LiquidPlanner. The watermark and
+    pending time are saved after every poll and push, so a restarted watcher resumes where it stopped.
+
+    Entries edited within REREAD_SECS of ending are re-read and only the difference is posted. This replaces running
+    Timesheet.py for the same days rather than complementing it.
+    """
+    database_path = get_database().database_path
+    since_epoch = get_epoch_from_datetime(since) if since is not None else get_epoch_from_datetime()
+    state = load_watch_state(database_path, since_epoch)
+    print(f'Watching MemTime from {datetime.datetime.fromtimestamp(state["watermark"]).strftime("%d/%m/%Y %H:%M:%S")}')
+
+    all_posted = True
+    last_push = time.monotonic()
+    try:
+        while True:
+            updated_task_count = poll(state)
+            save_watch_state(database_path, state)
+            if updated_task_count > 0:
+                print(f'{datetime.datetime.now().strftime("%H:%M:%S")} Found new time for {updated_task_count} task(s)')
+
+            if once or time.monotonic() - last_push >= push_interval_secs:
+                all_posted = push(state, database_path)
+                save_watch_state(database_path, state)
+                last_push = time.monotonic()
+
+            if once:
+                break
+            time.sleep(poll_interval_secs)
+    except KeyboardInterrupt:
+        save_watch_state(database_path, state)
+        print('\nStopped watching. Pending time will be posted on the next run.')
+
+    record_result('watermark', state['watermark'])
+    record_result('pending_tasks', len(state['pending']))
+    return EXIT_CODE_SUCCESS if all_posted else EXIT_CODE_PARTIAL_FAILURE
+
+if __name__ == '__main__':
+    # A snapshot would never see new entries, so watch mode reads the live file through a read-only connection
+    parser = build_parser('Continuously post new MemTime time entries to LiquidPlanner.', READ_MODE_READONLY)
+    parser.add_argument('--interval', type=int, default=DEFAULT_POLL_INTERVAL_SECS, metavar='SECONDS',
+                        help='How often to check MemTime for new time entries.')
+    parser.add_argument('--push-interval', type=int, default=DEFAULT_PUSH_INTERVAL_SECS, metavar='SECONDS',
+                        help='How often to post accumulated time to LiquidPlanner.')
+    parser.add_argument('--since', type=lambda date_str: datetime.datetime.strptime(date_str, '%d/%m/%Y'), metavar='DD/MM/YYYY',
+                        help='Where to start reading time entries the first time this database is watched. Defaults to now.')
+    parser.add_argument('--once', action='store_true',
+                        help='Poll and post once, then exit. Useful for scheduled runs.')
+    args = parser.parse_args()
+    apply_arguments(args)
+    run_script(args, lambda: main(args.interval, args.push_interval, args.since, args.once))
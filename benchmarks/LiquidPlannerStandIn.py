@@ -0,0 +1,138 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from benchmarks.SyntheticWorkspace import DEFAULT_ACTIVITY_ID, MEMBER_ID
+
+
+ACCOUNT_PATH = re.compile(r'^/api/v1/account$')
+MEMBER_PATH = re.compile(r'^/api/v1/workspaces/\d+/members/(\d+)$')
+TASKS_PATH = re.compile(r'^/api/v1/workspaces/\d+/tasks$')
+UPCOMING_TASKS_PATH = re.compile(r'^/api/v1/workspaces/\d+/upcoming_tasks$')
+TRACK_TIME_PATH = re.compile(r'^/api/v1/workspaces/\d+/treeitems/(\d+)/track_time$')
+
+
+class LiquidPlannerStandIn:
+    """
+    Local HTTP server answering the LiquidPlanner endpoints used by the scripts from an in-memory set of tasks. Every
+    request waits latency_secs, and a throttle_ratio share of requests are answered with 429 and Retry-After.
+    """
+    def __init__(self, tasks: List[dict], latency_secs: float = 0.0, throttle_ratio: float = 0.0, retry_after_secs: float = 0.0, seed: int = 0):
+        self.tasks: Dict[int, dict] = {task['id']: task for task in tasks}
+        self.upcoming_tasks = [task for task in tasks if not task['assignments'][0]['is_done']]
+        self.latency_secs = latency_secs
+        self.throttle_ratio = throttle_ratio
+        self.retry_after_secs = retry_after_secs
+
+        self.request_counts: Dict[str, int] = {}
+        self.throttled_count = 0
+        self.posted_work = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer = None
+
+    @property
+    def api_url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}/api/v1/'
+
+    def start(self) -> 'LiquidPlannerStandIn':
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are sent in one write, so delayed ACKs do not add latency to every response
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stand_in.handle(self, 'GET')
+
+            def do_POST(self):
+                stand_in.handle(self, 'POST')
+
+            def log_message(self, *_):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'LiquidPlannerStandIn':
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {}
+            self.throttled_count = 0
+            self.posted_work = 0.0
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str):
+        url = urlsplit(request.path)
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        if self.latency_secs > 0:
+            time.sleep(self.latency_secs)
+
+        with self._lock:
+            throttled = self._random.random() < self.throttle_ratio
+            if throttled:
+                self.throttled_count += 1
+        if throttled:
+            self.respond(request, 429, {'error': 'Throttled'}, {'Retry-After': str(self.retry_after_secs)})
+            return
+
+        if method == 'GET' and ACCOUNT_PATH.match(url.path):
+            self.count('account')
+            self.respond(request, 200, {'id': MEMBER_ID})
+        elif method == 'GET' and MEMBER_PATH.match(url.path):
+            self.count('members')
+            member_id = int(MEMBER_PATH.match(url.path).group(1))
+            self.respond(request, 200, {'id': member_id, 'default_activity_id': DEFAULT_ACTIVITY_ID})
+        elif method == 'GET' and TASKS_PATH.match(url.path):
+            self.count('tasks')
+            # The client sends filter[]=id=1,2,3 without encoding it as a key and value
+            task_ids = [int(task_id) for task_id in unquote(url.query).split('filter[]=id=')[-1].split('&')[0].split(',') if task_id != '']
+            self.respond(request, 200, [self.tasks[task_id] for task_id in task_ids if task_id in self.tasks])
+        elif method == 'GET' and UPCOMING_TASKS_PATH.match(url.path):
+            self.count('upcoming_tasks')
+            query = dict(parse_qsl(url.query))
+            offset = int(query.get('offset', 0))
+            limit = int(query.get('limit', len(self.upcoming_tasks)))
+            self.respond(request, 200, self.upcoming_tasks[offset:offset + limit])
+        elif method == 'POST' and TRACK_TIME_PATH.match(url.path):
+            self.count('track_time')
+            task_id = int(TRACK_TIME_PATH.match(url.path).group(1))
+            form = dict(parse_qsl(body.decode()))
+            with self._lock:
+                self.posted_work += float(form.get('work', 0))
+            self.respond(request, 200, self.tasks.get(task_id, {'id': task_id}))
+        else:
+            self.respond(request, 404, {'error': f'No stand-in for {method} {url.path}'})
+
+    def count(self, endpoint: str):
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def respond(self, request: BaseHTTPRequestHandler, status_code: int, body, headers: Dict[str, str] = None):
+        data = json.dumps(body).encode()
+        request.send_response(status_code)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(data)
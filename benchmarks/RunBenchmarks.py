@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import ModuleType
+from typing import Callable, Dict, List
+
+import ArchiveMemtimeTasks
+import RefreshMemtimeTasks
+import Timesheet
+from benchmarks.LiquidPlannerStandIn import LiquidPlannerStandIn
+from benchmarks.SyntheticWorkspace import create_memtime_database, generate_liquid_planner_tasks
+from utils.LiquidPlanner import LiquidPlannerClient, set_client
+from utils.MemTime import open_database, READ_MODES, READ_MODE_LIVE
+from utils.SubmissionLedger import get_submission_ledger
+from utils.TaskCache import get_task_cache
+from utils.Util import set_answer, set_non_interactive, STATE_DIRECTORY_ENV, CONFIRM_ANSWER_KEY
+
+
+BENCHMARK_WORKSPACE_ID = 1
+DATABASE_FILENAME = 'memtime.db'
+
+# Module-level functions timed as phases. Each is replaced on the script module for the duration of a run, so calls
+# made by the script (and only those) are timed.
+SCRIPT_PHASES: Dict[str, List[str]] = {
+    'timesheet': ['build_timesheet_days', 'fetch_cached_identity', 'fetch_cached_tasks_by_ids', 'build_submissions', 'submit_timesheet_entries'],
+    'refresh': ['check_and_create_shared_time_entities', 'fetch_cached_identity', 'fetch_upcoming_tasks', 'get_upcoming_tasks', 'query_tasks', 'query_projects',
+                'filter_tasks_to_create', 'confirm_and_create_projects', 'confirm_and_create_tasks', 'set_entities_is_active', 'set_entity_names', 'set_entity_parents'],
+    'archive': ['query_tasks', 'fetch_cached_timed_tasks_by_ids', 'fetch_cached_identity', 'set_entities_is_active'],
+}
+
+def timed(function: Callable, phase_times: Dict[str, float], name: str) -> Callable:
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            phase_times[name] = phase_times.get(name, 0.0) + time.perf_counter() - start_time
+    return wrapper
+
+@contextlib.contextmanager
+def time_phases(module: ModuleType, names: List[str], phase_times: Dict[str, float]):
+    originals = {name: getattr(module, name) for name in names}
+    try:
+        for name, function in originals.items():
+            setattr(module, name, timed(function, phase_times, name))
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(module, name, function)
+
+def reset_state(state_directory: str, warm_cache: bool):
+    # Cached LiquidPlanner data is kept between runs when warm, but the ledger is always cleared so time is posted
+    get_task_cache().close()
+    get_submission_ledger().posted_work = None
+    for filename in os.listdir(state_directory):
+        if not warm_cache or filename.startswith('submission_ledger'):
+            os.remove(os.path.join(state_directory, filename))
+
+def run_script(name: str, database_path: str, read_mode: str, dates: List[datetime.datetime], stand_in: LiquidPlannerStandIn, verbose: bool) -> dict:
+    if name == 'timesheet':
+        module, main = Timesheet, lambda: Timesheet.main(dates, use_ledger=False)
+    elif name == 'refresh':
+        module, main = RefreshMemtimeTasks, RefreshMemtimeTasks.main
+    else:
+        module, main = ArchiveMemtimeTasks, ArchiveMemtimeTasks.archive_memtime_tasks
+
+    phase_times: Dict[str, float] = {}
+    stand_in.reset_counts()
+    output = sys.stdout if verbose else io.StringIO()
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(output), time_phases(module, SCRIPT_PHASES[name], phase_times), open_database(database_path, read_mode):
+        main()
+    total_secs = time.perf_counter() - start_time
+
+    return {
+        'total_secs': total_secs,
+        'phase_secs': phase_times,
+        'requests': dict(stand_in.request_counts),
+        'throttled': stand_in.throttled_count
+    }
+
+def summarise(runs: List[dict]) -> dict:
+    phase_names = list(dict.fromkeys(name for run in runs for name in run['phase_secs']))
+    return {
+        'runs': len(runs),
+        'median_secs': statistics.median([run['total_secs'] for run in runs]),
+        'min_secs': min([run['total_secs'] for run in runs]),
+        'phase_median_secs': {name: statistics.median([run['phase_secs'].get(name, 0.0) for run in runs]) for name in phase_names},
+        'requests': runs[-1]['requests'],
+        'throttled': runs[-1]['throttled']
+    }
+
+def print_summary(name: str, summary: dict):
+    print(f'\n{name}: median {summary["median_secs"] * 1000:.1f} ms, min {summary["min_secs"] * 1000:.1f} ms over {summary["runs"]} run(s)')
+    for phase_name, phase_secs in summary['phase_median_secs'].items():
+        print(f'\t{phase_name.ljust(40)} {phase_secs * 1000:9.1f} ms')
+    requests_str = ', '.join([f'{endpoint} {count}' for endpoint, count in summary['requests'].items()])
+    print(f'\tRequests: {requests_str or "none"} ({summary["throttled"]} throttled)')
+
+def main(args: argparse.Namespace) -> dict:
+    work_directory = tempfile.mkdtemp(prefix='memtime-benchmark-')
+    state_directory = os.path.join(work_directory, 'state')
+    os.makedirs(state_directory)
+    os.environ[STATE_DIRECTORY_ENV] = state_directory
+
+    # Every decision is answered up front, as the scripts run exactly as they would with --yes
+    set_non_interactive(True)
+    set_answer(CONFIRM_ANSWER_KEY, True)
+    set_answer(Timesheet.SKIP_INVALID_ANSWER_KEY, True)
+    set_answer(Timesheet.SHARED_SPLIT_ANSWER_KEY, True)
+    set_answer(Timesheet.RETRY_ANSWER_KEY, False)
+    set_answer(RefreshMemtimeTasks.RENAME_ANSWER_KEY, True)
+    set_answer(RefreshMemtimeTasks.MOVE_ANSWER_KEY, True)
+
+    try:
+        generate_start_time = time.perf_counter()
+        tasks = generate_liquid_planner_tasks(args.projects, args.tasks_per_project, seed=args.seed)
+        template_path = os.path.join(work_directory, f'template-{DATABASE_FILENAME}')
+        dates = create_memtime_database(template_path, tasks, args.days, args.entries_per_day, args.blob_bytes, seed=args.seed)
+        print(f'Generated {len(tasks)} LiquidPlanner tasks and {args.days * args.entries_per_day} time entries '
+              f'({os.path.getsize(template_path) // 1024} KiB) in {time.perf_counter() - generate_start_time:.2f}s')
+
+        results: Dict[str, dict] = {}
+        with LiquidPlannerStandIn(tasks, args.latency_ms / 1000, args.throttle_ratio, seed=args.seed) as stand_in:
+            set_client(LiquidPlannerClient('benchmark@example.com', 'benchmark', BENCHMARK_WORKSPACE_ID, stand_in.api_url, backoff_secs=0.01))
+
+            for name in args.scripts:
+                runs: List[dict] = []
+                for _ in range(args.repeat):
+                    # Each run starts from an unmodified copy, as refresh and archive write to the database
+                    database_path = os.path.join(work_directory, DATABASE_FILENAME)
+                    shutil.copyfile(template_path, database_path)
+                    reset_state(state_directory, args.warm_cache)
+                    runs.append(run_script(name, database_path, args.read_mode, dates, stand_in, args.verbose))
+
+                results[name] = summarise(runs)
+                print_summary(name, results[name])
+
+        get_task_cache().close()
+        return results
+    finally:
+        if args.keep:
+            print(f'\nBenchmark files kept in {work_directory}')
+        else:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the scripts against a synthetic MemTime database and a local LiquidPlanner stand-in.')
+    parser.add_argument('scripts', nargs='*', metavar='SCRIPT',
+                        help=f'Scripts to benchmark ({", ".join(SCRIPT_PHASES.keys())}). Defaults to all of them.')
+    parser.add_argument('--projects', type=int, default=20, help='Number of LiquidPlanner projects.')
+    parser.add_argument('--tasks-per-project', type=int, default=25, help='Number of LiquidPlanner tasks in each project.')
+    parser.add_argument('--days', type=int, default=5, help='Number of days of time entries, ending yesterday. Timesheet logs all of them.')
+    parser.add_argument('--entries-per-day', type=int, default=40, help='Number of time entries on each day.')
+    parser.add_argument('--blob-bytes', type=int, default=200, help='Size of the padding in each timeEntryFields JSON blob.')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added by the stand-in to every request.')
+    parser.add_argument('--throttle-ratio', type=float, default=0.0, help='Share of requests answered with 429.')
+    parser.add_argument('--read-mode', choices=READ_MODES, default=READ_MODE_LIVE, help='How the scripts read the MemTime database.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each script.')
+    parser.add_argument('--warm-cache', action='store_true', help='Keep cached LiquidPlanner data between runs.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data and throttling.')
+    parser.add_argument('--json', metavar='PATH', help='Also write the results to a JSON file.')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated database and state directory.')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of the scripts.')
+    args = parser.parse_args()
+    args.scripts = args.scripts or list(SCRIPT_PHASES.keys())
+    for script in args.scripts:
+        if script not in SCRIPT_PHASES:
+            parser.error(f'unknown script "{script}"')
+
+    results = main(args)
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
@@ -0,0 +1,39 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+SCRIPT_MODULES = ['Timesheet', 'RefreshMemtimeTasks', 'ArchiveMemtimeTasks', 'WatchTimesheet', 'TeamTimesheet']
+# Modules which should only be imported once they are needed
+DEFERRED_MODULES = ['requests', 'tzlocal', 'env', 'concurrent.futures', 'hashlib']
+
+def time_import(module: str, repeat: int) -> List[float]:
+    times: List[float] = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+        times.append(time.perf_counter() - start_time)
+    return times
+
+def get_loaded_deferred_modules(module: str) -> List[str]:
+    code = f'import sys, {module}; print(",".join([name for name in {DEFERRED_MODULES!r} if name in sys.modules]))'
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.strip()
+    return [name for name in output.split(',') if name != '']
+
+def main(modules: List[str], repeat: int):
+    baseline_secs = statistics.median(time_import('sys', repeat))
+    print(f'Interpreter start: {baseline_secs * 1000:.1f} ms (median of {repeat})')
+    for module in modules:
+        import_secs = statistics.median(time_import(module, repeat)) - baseline_secs
+        loaded_modules = get_loaded_deferred_modules(module)
+        print(f'\t{module.ljust(25)} +{import_secs * 1000:6.1f} ms | eagerly loaded: {", ".join(loaded_modules) or "none"}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time a cold import of each script in a fresh interpreter.')
+    parser.add_argument('modules', nargs='*', metavar='MODULE', help=f'Modules to import. Defaults to {", ".join(SCRIPT_MODULES)}.')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of imports of each module.')
+    args = parser.parse_args()
+    main(args.modules or SCRIPT_MODULES, args.repeat)
@@ -0,0 +1,138 @@
+import datetime
+import json
+import random
+import sqlite3
+from typing import Dict, List
+
+from utils.MemTime import ENTITY_PROJECT_TYPE, ENTITY_TASK_TYPE, SHARED_TIME_NAME, SHARED_TIME_COLOR
+from utils.Util import get_epoch_from_datetime
+
+
+MEMBER_ID = 1000001
+OTHER_MEMBER_ID = 1000002
+DEFAULT_ACTIVITY_ID = 500001
+WORKSPACE_NAME = 'Benchmark Workspace'
+FIRST_TASK_ID = 10000000
+FIRST_PROJECT_ID = 20000000
+
+# Matches the tables and columns MemTime creates, including the ones this repository never reads
+CREATE_TABLES = '''
+    CREATE TABLE entity (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        parentId INTEGER,
+        name TEXT,
+        description TEXT,
+        color TEXT,
+        keywords TEXT,
+        labels TEXT,
+        isActive INTEGER,
+        type TEXT,
+        config TEXT,
+        createdAt INTEGER
+    );
+    CREATE TABLE timeEntry (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity INTEGER,
+        start INTEGER,
+        end INTEGER,
+        timeEntryFields TEXT
+    );
+'''
+INSERT_ENTITY = '''
+    INSERT INTO entity (id, parentId, name, description, color, keywords, labels, isActive, type, config, createdAt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+INSERT_TIME_ENTRY = '''
+    INSERT INTO timeEntry (entity, start, end, timeEntryFields)
+    VALUES (?, ?, ?, ?)
+'''
+
+def generate_liquid_planner_tasks(project_count: int, tasks_per_project: int, done_ratio: float = 0.1, seed: int = 0) -> List[dict]:
+    """
+    Returns task JSON in the shape returned by the LiquidPlanner tasks and upcoming_tasks endpoints, in priority order.
+    Some assignments are done (for archiving) and some tasks belong to another member.
+    """
+    rand = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    tasks: List[dict] = []
+    for project_index in range(project_count):
+        for task_index in range(tasks_per_project):
+            task_id = FIRST_TASK_ID + len(tasks)
+            is_done = rand.random() < done_ratio
+            expected_start = now + datetime.timedelta(days=len(tasks) * 30 / max(project_count * tasks_per_project, 1))
+            high_effort_remaining = round(rand.uniform(1, 40), 2)
+            tasks.append({
+                'id': task_id,
+                'name': f'Task {project_index}.{task_index}',
+                'project_id': FIRST_PROJECT_ID + project_index,
+                'parent_crumbs': [WORKSPACE_NAME, f'Project {project_index}'],
+                'assignments': [{
+                    'person_id': OTHER_MEMBER_ID if rand.random() < 0.02 else MEMBER_ID,
+                    'activity_id': None if rand.random() < 0.5 else DEFAULT_ACTIVITY_ID + 1,
+                    'low_effort_remaining': round(high_effort_remaining * 0.75, 2),
+                    'high_effort_remaining': high_effort_remaining,
+                    'is_done': is_done,
+                    'done_on': (now - datetime.timedelta(days=rand.randint(1, 30))).isoformat() if is_done else None,
+                    'expected_start': expected_start.strftime('%Y-%m-%dT%H:%M:%S')
+                }]
+            })
+    return tasks
+
+def create_memtime_database(database_path: str, liquid_planner_tasks: List[dict], days: int, entries_per_day: int,
+                            blob_bytes: int = 200, task_coverage: float = 0.8, seed: int = 0) -> List[datetime.datetime]:
+    """
+    Writes a MemTime database containing projects and tasks for a share of the LiquidPlanner tasks, plus time entries
+    for the given number of days up to yesterday. A few tasks are archived or named differently to LiquidPlanner, and
+    the last project is left out so the refresh script has something to create. Returns the dates with time entries.
+    """
+    rand = random.Random(seed)
+    created_at = get_epoch_from_datetime()
+    config = str({"showActivityField": True, "showBillableField": True, "defaultBillability": "inherit", "defaultActivity": None})
+    entity_rows: List[tuple] = []
+
+    project_ids = sorted(set(task['project_id'] for task in liquid_planner_tasks))
+    memtime_project_ids: Dict[int, int] = {}
+    for project_id in project_ids[:-1] if len(project_ids) > 1 else project_ids:
+        memtime_project_ids[project_id] = len(entity_rows) + 1
+        entity_rows.append((len(entity_rows) + 1, None, f'Project {project_id - FIRST_PROJECT_ID}', f'{project_id}P', '#bbbbbb', None, '[]', 1, ENTITY_PROJECT_TYPE, config, created_at))
+
+    shared_project_id = len(entity_rows) + 1
+    entity_rows.append((shared_project_id, None, SHARED_TIME_NAME, None, SHARED_TIME_COLOR, None, '[]', 1, ENTITY_PROJECT_TYPE, config, created_at))
+    shared_task_id = len(entity_rows) + 1
+    entity_rows.append((shared_task_id, shared_project_id, SHARED_TIME_NAME, None, None, None, '[]', 1, ENTITY_TASK_TYPE, config, created_at))
+
+    task_labels: Dict[int, str] = {shared_task_id: SHARED_TIME_NAME}
+    for task in liquid_planner_tasks:
+        if task['project_id'] not in memtime_project_ids or rand.random() >= task_coverage:
+            continue
+        name = task['name'] if rand.random() >= 0.05 else f'{task["name"]} (old name)'
+        is_active = 0 if rand.random() < 0.05 else 1
+        task_labels[len(entity_rows) + 1] = name
+        entity_rows.append((len(entity_rows) + 1, memtime_project_ids[task['project_id']], name, str(task['id']), None, None, '[]', is_active, ENTITY_TASK_TYPE, config, created_at))
+
+    # Time is logged on weekdays during working hours, with roughly one in ten entries against shared time
+    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [today - datetime.timedelta(days=day) for day in range(days, 0, -1)]
+    entity_ids = list(task_labels.keys())
+    padding = 'x' * blob_bytes
+    time_entry_rows: List[tuple] = []
+    for date in dates:
+        day_start_epoch = get_epoch_from_datetime(date.replace(hour=9))
+        for _ in range(entries_per_day):
+            entity_id = shared_task_id if rand.random() < 0.1 else rand.choice(entity_ids)
+            start_epoch = day_start_epoch + rand.randint(0, 8 * 60 * 60)
+            end_epoch = start_epoch + rand.randint(5 * 60, 60 * 60)
+            fields = {'entity': {'entityType': ENTITY_TASK_TYPE, 'label': task_labels[entity_id]}, 'note': padding}
+            time_entry_rows.append((entity_id, start_epoch, end_epoch, json.dumps(fields)))
+
+    conn = sqlite3.connect(database_path)
+    try:
+        conn.executescript(CREATE_TABLES)
+        with conn:
+            conn.executemany(INSERT_ENTITY, entity_rows)
+            conn.executemany(INSERT_TIME_ENTRY, time_entry_rows)
+    finally:
+        conn.close()
+
+    return dates
@@ -0,0 +1,55 @@
+from typing import Dict, List
+
+from models.Project import Project
+from models.Task import Task
+
+class EntityIndex:
+    """
+    Lookups of MemTime tasks and projects by MemTime ID, LiquidPlanner ID and parent ID, built once per run. LiquidPlanner
+    and parent lookups return every matching entity as duplicates can exist.
+    """
+    def __init__(self, tasks: List[Task] = None, projects: List[Project] = None):
+        self.tasks_by_id: Dict[int, Task] = {}
+        self.tasks_by_liquid_planner_id: Dict[int, List[Task]] = {}
+        self.tasks_by_parent_id: Dict[int, List[Task]] = {}
+        self.projects_by_id: Dict[int, Project] = {}
+        self.projects_by_liquid_planner_id: Dict[int, List[Project]] = {}
+
+        for task in tasks or []:
+            self.add_task(task)
+        self.set_projects(projects or [])
+
+    def add_task(self, task: Task):
+        self.tasks_by_id[task.id] = task
+        self.tasks_by_parent_id.setdefault(task.parent_id, []).append(task)
+        if task.liquid_planner_id is not None:
+            self.tasks_by_liquid_planner_id.setdefault(task.liquid_planner_id, []).append(task)
+
+    def set_projects(self, projects: List[Project]):
+        self.projects_by_id = {}
+        self.projects_by_liquid_planner_id = {}
+        for project in projects:
+            self.projects_by_id[project.id] = project
+            if project.liquid_planner_id is not None:
+                self.projects_by_liquid_planner_id.setdefault(project.liquid_planner_id, []).append(project)
+
+    def get_tasks(self) -> List[Task]:
+        return list(self.tasks_by_id.values())
+
+    def get_task(self, id: int) -> Task:
+        return self.tasks_by_id.get(id)
+
+    def get_tasks_by_liquid_planner_id(self, liquid_planner_id: int) -> List[Task]:
+        return self.tasks_by_liquid_planner_id.get(liquid_planner_id, [])
+
+    def get_tasks_by_parent_id(self, parent_id: int) -> List[Task]:
+        return self.tasks_by_parent_id.get(parent_id, [])
+
+    def get_projects(self) -> List[Project]:
+        return list(self.projects_by_id.values())
+
+    def get_project(self, id: int) -> Project:
+        return self.projects_by_id.get(id)
+
+    def get_projects_by_liquid_planner_id(self, liquid_planner_id: int) -> List[Project]:
+        return self.projects_by_liquid_planner_id.get(liquid_planner_id, [])
@@ -1,20 +1,32 @@
+import copy
 from typing import List
 from models.Task import Task
 from utils.Util import parse_liquid_planner_id
 
 class Project:
+    __slots__ = ('id', 'label', 'liquid_planner_id', 'is_active', 'tasks', 'total_task_time_secs')
+
     def __init__(self, id: int, label: str, liquid_planner_id: str, is_active: bool):
         self.id = id
         self.label = label
         self.liquid_planner_id = parse_liquid_planner_id(liquid_planner_id)
         self.is_active = is_active
         self.tasks: List[Task] = []
+        self.total_task_time_secs = 0
+
+    def copy_without_tasks(self) -> 'Project':
+        project = copy.copy(self)
+        project.tasks = []
+        project.total_task_time_secs = 0
+        return project
 
     def add_task(self, task: Task):
+        # Tasks are added once their time is known, so the total can be kept incrementally
         self.tasks.append(task)
+        self.total_task_time_secs += task.logged_time_secs
     
     def get_task_ids(self) -> List[int]:
         return [task.id for task in self.tasks]
 
     def get_total_task_time(self) -> float:
-        return sum([task.get_logged_time_hrs() for task in self.tasks])
+        return self.total_task_time_secs / 60.0 / 60.0
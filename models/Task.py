@@ -1,10 +1,18 @@
+import copy
 import datetime
 from typing import List, Union
 
-from models.TimesheetEntry import TimesheetEntry
+from models.TimesheetEntry import TimesheetEntry, ENTRY_TIME_DECIMALS
 from utils.Util import parse_liquid_planner_id
 
 class Task:
+    __slots__ = (
+        'id', 'label', 'liquid_planner_id', 'parent_id', 'is_active',
+        'timesheet_entries', 'logged_time_secs',
+        'liquid_planner_crumbs', 'liquid_planner_name', 'assignment', 'liquid_planner_activity_id',
+        'liquid_planner_remaining_low', 'liquid_planner_remaining_high'
+    )
+
     def __init__(self, id: int, label: str, description: str, parent_id: int, is_active: bool):
         self.id = id
         self.label = label
@@ -13,12 +21,26 @@ class Task:
         self.is_active = is_active
 
         self.timesheet_entries: List[TimesheetEntry] = []
+        # Running total kept in whole seconds so rounding is only applied when time is output
+        self.logged_time_secs = 0
     
+    def copy_without_time(self) -> 'Task':
+        # Used to hold a separate day's time for the same MemTime task
+        task = copy.copy(self)
+        task.timesheet_entries = []
+        task.logged_time_secs = 0
+        return task
+
     def add_entry(self, entry: TimesheetEntry):
         self.timesheet_entries.append(entry)
-    
+        self.logged_time_secs += entry.end - entry.start
+
+    def add_aggregated_time(self, time_secs: int):
+        # Time already summed by the database, used when individual entries are not needed
+        self.logged_time_secs += time_secs
+
     def get_logged_time_hrs(self) -> float:
-        return sum([entry.get_entry_time_hrs() for entry in self.timesheet_entries])
+        return self.logged_time_secs / 60.0 / 60.0
 
     def set_liquid_planner_task(self, task_json: dict, member_id: int):
         self.liquid_planner_crumbs = task_json['parent_crumbs']
@@ -52,8 +74,8 @@ class Task:
             return f'{self.label} ---> {lp_task_label}'
     
     def get_print_summary_with_time(self, shared_time_multiplier: float, ignore_lp_task: bool) -> str:
-        logged_time_str = f'{str(round(self.get_logged_time_hrs() * shared_time_multiplier, 2)).ljust(4)} hrs'
+        logged_time_str = f'{str(round(self.get_logged_time_hrs() * shared_time_multiplier, ENTRY_TIME_DECIMALS)).ljust(4)} hrs'
         return f'{logged_time_str} | {self.get_print_summary(ignore_lp_task)}'
     
     def __str__(self):
-        return f'{self.id}, {self.label}, {self.liquid_planner_url}, {len(self.timesheet_entries)} timesheet entries totalling {self.get_logged_time_hrs()} hrs'
+        return f'{self.id}, {self.label}, {self.liquid_planner_id}, {len(self.timesheet_entries)} timesheet entries totalling {round(self.get_logged_time_hrs(), ENTRY_TIME_DECIMALS)} hrs'
@@ -0,0 +1,54 @@
+import datetime
+from typing import List, Union
+
+from models.Project import Project
+from models.Task import Task
+
+POST_HOUR = 17
+
+class TimesheetDay:
+    def __init__(self, date: datetime.datetime, tasks: List[Task], shared_time_project: Union[Project, None]):
+        self.date = date
+        self.tasks = tasks
+        self.shared_time_project = shared_time_project
+
+        # Create task lists based on if they are shared time tasks and they have valid LP IDs
+        self.tasks_to_timesheet: List[Task] = []
+        self.invalid_tasks: List[Task] = []
+        for task in tasks:
+            if shared_time_project is not None and task.parent_id == shared_time_project.id:
+                shared_time_project.add_task(task)
+            elif task.liquid_planner_id is None:
+                self.invalid_tasks.append(task)
+            else:
+                self.tasks_to_timesheet.append(task)
+
+        self.total_time = 0.0
+        self.total_shared_project_time = 0.0
+        self.shared_time_multiplier = 1.0
+
+    def set_shared_time_multiplier(self, split_over_valid_tasks: bool):
+        if split_over_valid_tasks:
+            invalid_task_ids = [task.id for task in self.invalid_tasks]
+            shared_time_total_tasks = [task for task in self.tasks if task.id not in invalid_task_ids]
+        else:
+            shared_time_total_tasks = self.tasks
+
+        self.total_time = sum([task.logged_time_secs for task in shared_time_total_tasks]) / 60.0 / 60.0
+        self.total_shared_project_time = 0 if self.shared_time_project is None else self.shared_time_project.get_total_task_time()
+
+        # A day containing only shared time has nothing to spread it over
+        if self.total_time > self.total_shared_project_time:
+            self.shared_time_multiplier = self.total_time / (self.total_time - self.total_shared_project_time)
+        else:
+            self.shared_time_multiplier = 1.0
+
+    def get_invalid_task_time(self) -> float:
+        return sum([task.logged_time_secs for task in self.invalid_tasks]) / 60.0 / 60.0 * self.shared_time_multiplier
+
+    def get_post_datetime(self, local_timezone: datetime.tzinfo) -> datetime.datetime:
+        post_dt = self.date.replace(hour=POST_HOUR)
+        now = datetime.datetime.now()
+        if now < post_dt:
+            post_dt = now
+        return post_dt.replace(microsecond=0).astimezone(local_timezone)
@@ -1,6 +1,8 @@
 ENTRY_TIME_DECIMALS = 2
 
 class TimesheetEntry:
+    __slots__ = ('entity_id', 'entity_type', 'label', 'start', 'end')
+
     def __init__(self, entity_id: int, entity_type: str, label: str, start: int, end: int):
         self.entity_id = entity_id
         self.entity_type = entity_type
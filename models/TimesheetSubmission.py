@@ -0,0 +1,47 @@
+import datetime
+from typing import Union
+
+STATUS_PENDING = 'pending'
+STATUS_POSTED = 'posted'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+class TimesheetSubmission:
+    def __init__(self, date: datetime.datetime, memtime_task_id: int, liquid_planner_id: int, label: str, body: dict):
+        self.date = date
+        self.memtime_task_id = memtime_task_id
+        self.liquid_planner_id = liquid_planner_id
+        self.label = label
+        self.body = body
+
+        self.status = STATUS_PENDING
+        self.attempts = 0
+        self.retries = 0
+        self.latency_secs = 0.0
+        self.error: Union[str, None] = None
+        # Cleared when the entry failed with an error which posting again would not fix, such as a 400 or 403
+        self.retryable = True
+
+    def is_posted(self) -> bool:
+        return self.status == STATUS_POSTED
+
+    def is_retryable(self) -> bool:
+        return not self.is_posted() and self.retryable
+
+    def to_dict(self) -> dict:
+        return {
+            'date': self.date.strftime('%Y-%m-%d'),
+            'memtime_task_id': self.memtime_task_id,
+            'liquid_planner_id': self.liquid_planner_id,
+            'label': self.label,
+            'work': self.body['work'],
+            'status': self.status,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'latency_secs': round(self.latency_secs, 3),
+            'error': self.error,
+            'retryable': self.is_retryable()
+        }
+
+    def __str__(self):
+        return f'{self.status.upper().ljust(7)} | {self.date.strftime("%d/%m/%Y")} | {str(self.body["work"]).ljust(4)} hrs | {self.label}'
@@ -0,0 +1,96 @@
+import argparse
+import contextlib
+import json
+import sys
+from typing import Callable, Union
+
+from utils import DoneStateStore, IdentityCache, SyncState, TaskCache
+from utils.MemTime import open_database, READ_MODES, READ_MODE_LIVE
+from utils.Profiler import enable_profiling, get_phase_breakdown, is_profiling, print_phase_breakdown, span, write_profile, PROFILE_FORMAT_CHROME, PROFILE_FORMAT_JSON
+from utils.Util import exit, get_result, record_result, set_answer, set_non_interactive, CONFIRM_ANSWER_KEY, EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+
+
+EXIT_CODE_STATUSES = {0: 'success', 1: 'failed', 2: 'usage_error', 3: 'partial_failure'}
+
+def build_parser(description: str, default_read_mode: str = READ_MODE_LIVE) -> argparse.ArgumentParser:
+    """
+    Returns an argument parser with the options shared by every script. default_read_mode is how the script reads the
+    MemTime database unless --read-mode is given.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--database', metavar='PATH', default=None,
+                        help='Path to the MemTime database. Defaults to MEMTIME_DATABASE_PATH, then automatic discovery.')
+    parser.add_argument('--read-mode', choices=READ_MODES, default=default_read_mode,
+                        help=f'How to read the MemTime database while MemTime is running: directly (live), through a read-only '
+                             f'connection (readonly) or from a copy taken at the start of the run (snapshot). Defaults to {default_read_mode}.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached LiquidPlanner data, sync state and known done states, and fetch and compare everything again.')
+    parser.add_argument('--yes', action='store_true',
+                        help='Answer yes to every confirmation. Implies --non-interactive.')
+    parser.add_argument('--non-interactive', action='store_true',
+                        help='Never prompt. Any decision without a flag fails the run with exit code 2.')
+    parser.add_argument('--json', action='store_true',
+                        help='Write a JSON summary of the run to stdout and progress to stderr. Implies --non-interactive.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each MemTime query and LiquidPlanner request and print a breakdown at the end of the run.')
+    parser.add_argument('--profile-output', metavar='PATH', default=None,
+                        help='Also write every timed span to PATH. Implies --profile.')
+    parser.add_argument('--profile-format', choices=[PROFILE_FORMAT_CHROME, PROFILE_FORMAT_JSON], default=PROFILE_FORMAT_CHROME,
+                        help='Format of --profile-output: Chrome trace events (for chrome://tracing or Perfetto) or a plain list of spans.')
+    return parser
+
+def apply_arguments(args: argparse.Namespace):
+    """
+    Applies the shared options parsed by a parser from build_parser().
+    """
+    TaskCache.set_refresh(args.refresh)
+    IdentityCache.set_refresh(args.refresh)
+    SyncState.set_refresh(args.refresh)
+    DoneStateStore.set_refresh(args.refresh)
+
+    set_non_interactive(args.non_interactive or args.yes or args.json)
+    if args.yes:
+        set_answer(CONFIRM_ANSWER_KEY, True)
+
+    if args.profile or args.profile_output is not None:
+        enable_profiling()
+
+def run_main(args: argparse.Namespace, main: Callable[[], Union[int, None]]) -> Union[int, None]:
+    try:
+        with span('script.main'), open_database(args.database, args.read_mode):
+            return main()
+    finally:
+        if is_profiling():
+            print_phase_breakdown()
+            if args.profile_output is not None:
+                write_profile(args.profile_output, args.profile_format)
+                print(f'Profile written to {args.profile_output}')
+
+def run_script(args: argparse.Namespace, main: Callable[[], Union[int, None]]):
+    """
+    Runs a script's main function against the MemTime database and exits with the code it returns. With --json, the
+    values recorded with record_result() are written to stdout along with the exit code.
+    """
+    if not args.json:
+        exit_code = run_main(args, main)
+        exit(exit_code or EXIT_CODE_SUCCESS)
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            exit_code = run_main(args, main) or EXIT_CODE_SUCCESS
+    except SystemExit as error:
+        exit_code = error.code if isinstance(error.code, int) else EXIT_CODE_FAILURE
+    except Exception as error:
+        record_result('error', str(error) or type(error).__name__)
+        exit_code = EXIT_CODE_FAILURE
+
+    if is_profiling():
+        record_result('profile', {name: {'count': phase['count'], 'total_ms': round(phase['total_secs'] * 1000, 1)} for name, phase in get_phase_breakdown().items()})
+
+    output = {
+        'status': EXIT_CODE_STATUSES.get(exit_code, 'failed'),
+        'exit_code': exit_code,
+        **get_result()
+    }
+    print(json.dumps(output, indent=2))
+    sys.exit(exit_code)
@@ -0,0 +1,96 @@
+import datetime
+from typing import Dict, List, Tuple
+
+from utils.TaskCache import FIELD_TTL_SECS
+from utils.Util import load_state_json, save_state_json
+
+
+DONE_STATES_FILENAME = 'done_states.json'
+# A done task about to be archived is checked again once its known state is older than cached assignments may be
+DONE_RECHECK_SECS = FIELD_TTL_SECS['assignments']
+
+_refresh = False
+
+def set_refresh(refresh: bool):
+    """
+    Ignores the known done states for this run when refresh is True, so every task is checked again.
+    """
+    global _refresh
+    _refresh = refresh
+
+def get_member_assignment(task_json: dict, member_id: int) -> dict:
+    assignments = [assignment for assignment in task_json['assignments'] if assignment['person_id'] == member_id]
+    return assignments[0] if len(assignments) > 0 else None
+
+
+class DoneStateStore:
+    """
+    Last-known assignment of each LiquidPlanner task which was done, or no longer assigned to the member, when it was
+    last checked. Tasks not in the store are not known to be done and are always checked.
+    """
+    def __init__(self, member_id: int, done_states: Dict[str, dict] = None):
+        self.member_id = member_id
+        self.done_states: Dict[str, dict] = done_states or {}
+
+    def needs_check(self, task_id: int, expiry_date: datetime.datetime, now: float) -> bool:
+        done_state = self.done_states.get(str(task_id))
+        if done_state is None:
+            return True
+
+        # Nothing can be archived before its done date expires, so the task is left alone until then
+        assignment = done_state['assignment']
+        if assignment is not None and assignment['done_on'] is not None and assignment['done_on'] >= expiry_date.isoformat():
+            return False
+
+        # Otherwise the task would be archived, which is only decided locally on a recently checked state
+        return now - done_state['checked_at'] > DONE_RECHECK_SECS
+
+    def get_task_json(self, task_id: int) -> dict:
+        """
+        Returns the known state in the same form as a fetched task, or None when the task is not known to be done.
+        """
+        done_state = self.done_states.get(str(task_id))
+        if done_state is None:
+            return None
+
+        assignment = done_state['assignment']
+        return {
+            'id': task_id,
+            'name': done_state['name'],
+            'parent_crumbs': done_state['parent_crumbs'],
+            'assignments': [assignment] if assignment is not None else []
+        }
+
+    def update(self, timed_tasks_json: List[Tuple[dict, float]]):
+        """
+        Records each task's state as of the time it was fetched from LiquidPlanner, which may be earlier than now when
+        the task was served from the cache.
+        """
+        for task_json, checked_at in timed_tasks_json:
+            assignment = get_member_assignment(task_json, self.member_id)
+            if assignment is not None and not assignment['is_done']:
+                self.done_states.pop(str(task_json['id']), None)
+                continue
+
+            self.done_states[str(task_json['id'])] = {
+                'name': task_json['name'],
+                'parent_crumbs': task_json['parent_crumbs'],
+                'assignment': assignment,
+                'checked_at': checked_at
+            }
+
+    def retain(self, task_ids: List[int]):
+        # Archived tasks are no longer checked, and are checked from scratch if they are ever reactivated
+        task_ids = set([str(task_id) for task_id in task_ids])
+        self.done_states = {task_id: done_state for task_id, done_state in self.done_states.items() if task_id in task_ids}
+
+
+def load_done_state_store(member_id: int) -> DoneStateStore:
+    if _refresh:
+        return DoneStateStore(member_id)
+    return DoneStateStore(member_id, load_state_json(DONE_STATES_FILENAME, {}).get(str(member_id)))
+
+def save_done_state_store(done_state_store: DoneStateStore):
+    done_states: dict = load_state_json(DONE_STATES_FILENAME, {})
+    done_states[str(done_state_store.member_id)] = done_state_store.done_states
+    save_state_json(DONE_STATES_FILENAME, done_states)
@@ -0,0 +1,49 @@
+import os
+import time
+
+from utils.LiquidPlanner import get_client
+from utils.Util import get_state_path, load_state_json, save_state_json
+
+
+IDENTITY_FILENAME = 'identities.json'
+# Keyed by a hash including the password, so it is removed rather than migrated
+LEGACY_IDENTITY_FILENAME = 'identity.json'
+IDENTITY_TTL_SECS = 7 * 24 * 60 * 60
+
+_refresh = False
+
+def set_refresh(refresh: bool):
+    global _refresh
+    _refresh = refresh
+
+def remove_legacy_identities():
+    try:
+        os.remove(get_state_path(LEGACY_IDENTITY_FILENAME))
+    except FileNotFoundError:
+        pass
+
+def fetch_cached_identity(include_default_activity: bool = False) -> dict:
+    """
+    Returns the current user's member ID ('id') and optionally their 'default_activity_id'. Identities are cached per
+    account and workspace, so changing env.py automatically ignores the previous user's identity.
+    """
+    client = get_client()
+    account_key = client.get_account_key()
+    identities: dict = load_state_json(IDENTITY_FILENAME, {})
+
+    cached_identity: dict = identities.get(account_key)
+    is_expired = cached_identity is None or time.time() - cached_identity['cached_at'] > IDENTITY_TTL_SECS
+    if _refresh or is_expired:
+        identity = {'id': client.fetch_my_account()['id'], 'cached_at': time.time()}
+    else:
+        identity = dict(cached_identity)
+
+    if include_default_activity and 'default_activity_id' not in identity:
+        identity['default_activity_id'] = client.fetch_member(identity['id'])['default_activity_id']
+
+    if identity != cached_identity:
+        identities[account_key] = identity
+        save_state_json(IDENTITY_FILENAME, identities)
+        remove_legacy_identities()
+
+    return identity
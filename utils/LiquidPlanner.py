@@ -1,69 +1,322 @@
-import requests
-from requests.auth import HTTPBasicAuth
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List
 
-from env import LIQUID_PLANNER_EMAIL, LIQUID_PLANNER_PASSWORD
-from requests import Response
-from typing import List
+# requests and its dependencies make up most of the startup time, so they are only imported once a request is sent
+if TYPE_CHECKING:
+    from requests import Response, Session
+
+from utils.Profiler import is_profiling, span
 
 WORKSPACE_ID = 164559
-BASE_URL = f'https://app.liquidplanner.com/api/v1/workspaces/{WORKSPACE_ID}/'
+API_URL = 'https://app.liquidplanner.com/api/v1/'
+BASE_URL = f'{API_URL}workspaces/{WORKSPACE_ID}/'
+FETCH_ACCOUNT_URL = 'account'
 FETCH_MEMBER_URL_FORMAT = 'members/{0}'
 FETCH_TASKS_URL = 'tasks'
 FETCH_UPCOMING_TASKS_URL = 'upcoming_tasks'
 POST_TIMESHEET_URL_FORMAT = 'treeitems/{0}/track_time'
 
-AUTH = HTTPBasicAuth(LIQUID_PLANNER_EMAIL, LIQUID_PLANNER_PASSWORD)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT_SECS = (5, 30)  # (connect, read)
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_SECS = 0.5
+MAX_BACKOFF_SECS = 30
+DEFAULT_MAX_IDS_PER_REQUEST = 100
+DEFAULT_UPCOMING_TASKS_PAGE_SIZE = 25
+# Size of the single request the upcoming tasks were read with before paging, used if the server does not page
+UNPAGED_UPCOMING_TASKS_LIMIT = 100
+DEFAULT_MAX_URL_LENGTH = 2000
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Posting time is not idempotent, so a POST is only retried when the server has definitely not processed it
+POST_RETRY_STATUS_CODES = [429]
 
-def build_url(url_suffix: str, query_params: List[tuple[str, str]] = None) -> str:
-    if query_params is not None and len(query_params) > 0:
-        return BASE_URL + url_suffix + '?' + '&'.join([f'{key}={value}' for key, value in query_params])
-    else:
-        return BASE_URL + url_suffix
 
-def get(url_suffix: str, query_params: List[tuple[str, str]] = None) -> Response:
-    url = build_url(url_suffix, query_params)
-    return requests.get(url, auth=AUTH)
+class LiquidPlannerError(Exception):
+    def __init__(self, response: 'Response'):
+        super().__init__(f'Response Error: {response.text}')
+        self.status_code = response.status_code
+        self.response = response
 
-def post(url_suffix: str, body: dict) -> Response:
-    url = build_url(url_suffix)
-    return requests.post(url, data=body, auth=AUTH)
 
-def fetch_my_account() -> dict:
-    response = requests.get('https://app.liquidplanner.com/api/v1/account', auth=AUTH)
-    if response.status_code != 200:
-        raise Exception(f'Response Error: {response.text}')
+class LiquidPlannerClient:
+    """
+    Sends LiquidPlanner requests through a pooled keep-alive session, retrying throttled and failed requests with
+    exponential backoff and jitter.
+    """
+    def __init__(self, email: str, password: str, workspace_id: int = WORKSPACE_ID, api_url: str = API_URL,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT_SECS,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff_secs: float = DEFAULT_BACKOFF_SECS,
+                 max_ids_per_request: int = DEFAULT_MAX_IDS_PER_REQUEST, max_url_length: int = DEFAULT_MAX_URL_LENGTH):
+        self.api_url = api_url
+        self.base_url = f'{api_url}workspaces/{workspace_id}/'
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_secs = backoff_secs
+        self.pool_size = pool_size
+        self.max_ids_per_request = max_ids_per_request
+        self.max_url_length = max_url_length
+        self.email = email
+        self.password = password
+        self._local = threading.local()
+        self._session: 'Session' = None
+        self._session_lock = threading.Lock()
 
-    return response.json()
+    @property
+    def session(self) -> 'Session':
+        """
+        The pooled session, created with its auth and adapters when the first request is sent.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    from requests import Session
+                    from requests.adapters import HTTPAdapter
+                    from requests.auth import HTTPBasicAuth
 
-def fetch_member(member_id: str) -> dict:
-    response = get(FETCH_MEMBER_URL_FORMAT.format(member_id))
-    if response.status_code != 200:
-        raise Exception(f'Response Error: {response.text}')
+                    session = Session()
+                    session.auth = HTTPBasicAuth(self.email, self.password)
+                    session.headers['Accept-Encoding'] = 'gzip'
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
 
-    return response.json()
+    def get_account_key(self) -> str:
+        """
+        Returns a key identifying the account and workspace this client uses, for keying locally cached data. The
+        password is deliberately left out, as the key is stored in plain text.
+        """
+        return f'{self.email}|{self.base_url}'
 
-def fetch_tasks_by_ids(task_ids: List[int]) -> dict:
-    query_params: List[tuple[str, str]] = [('filter[]=id', ','.join(map(str, task_ids)))]
+    def __enter__(self) -> 'LiquidPlannerClient':
+        return self
 
-    response = get(FETCH_TASKS_URL, query_params)
-    if response.status_code != 200:
-        raise Exception(f'Response Error: {response.text}')
+    def __exit__(self, *_):
+        self.close()
 
-    return response.json()
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
-def fetch_upcoming_tasks(limit: int) -> dict:
-    query_params: List[tuple[str, str]] = [('flat', True), ('limit', limit)]
+    def build_url(self, url_suffix: str, query_params: List[tuple[str, str]] = None) -> str:
+        if query_params is not None and len(query_params) > 0:
+            return self.base_url + url_suffix + '?' + '&'.join([f'{key}={value}' for key, value in query_params])
+        else:
+            return self.base_url + url_suffix
 
-    response = get(FETCH_UPCOMING_TASKS_URL, query_params)
-    if response.status_code != 200:
-        raise Exception(f'Response Error: {response.text}')
+    def get_retry_delay(self, attempt: int, response: 'Response' = None) -> float:
+        # Full jitter exponential backoff, but never sooner than the server asked for
+        delay = random.uniform(0, min(MAX_BACKOFF_SECS, self.backoff_secs * (2 ** attempt)))
+        retry_after = None if response is None else response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                from email.utils import parsedate_to_datetime
+                try:
+                    retry_at = parsedate_to_datetime(retry_after).timestamp()
+                    delay = max(delay, retry_at - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return delay
 
-    return response.json()
+    def get_last_retry_count(self) -> int:
+        """
+        Returns how many times the last request made by the calling thread was retried.
+        """
+        return getattr(self._local, 'retry_count', 0)
 
-def post_timesheet_entry(task_id: int, body: dict):
-    post_url = POST_TIMESHEET_URL_FORMAT.format(task_id)
-    response = post(post_url, body)
+    def get_span_name(self, method: str, url: str) -> str:
+        # Spans are named by endpoint without IDs or query strings, so requests to the same endpoint are grouped
+        endpoint = url.split('?')[0].replace(self.base_url, '').replace(self.api_url, '')
+        endpoint = '/'.join(['{id}' if part.isdigit() else part for part in endpoint.split('/')])
+        return f'liquid_planner.{method} {endpoint}'
+
+    def request(self, method: str, url: str, **kwargs) -> 'Response':
+        if not is_profiling():
+            return self.request_with_retries(method, url, **kwargs)
+
+        with span(self.get_span_name(method, url)) as trace_span:
+            response = self.request_with_retries(method, url, **kwargs)
+            trace_span.set(status=response.status_code, bytes=len(response.content), retries=self._local.retry_count)
+            return response
+
+    def request_with_retries(self, method: str, url: str, **kwargs) -> 'Response':
+        import requests
+
+        retry_status_codes = POST_RETRY_STATUS_CODES if method == 'POST' else RETRY_STATUS_CODES
+        attempt = 0
+        while True:
+            self._local.retry_count = attempt
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                # A POST which may have reached the server must not be resent
+                is_retryable = method != 'POST' or isinstance(error, requests.ConnectTimeout)
+                if not is_retryable or attempt >= self.max_retries:
+                    raise
+                response = None
+            else:
+                if response.status_code not in retry_status_codes or attempt >= self.max_retries:
+                    return response
+
+            time.sleep(self.get_retry_delay(attempt, response))
+            attempt += 1
+
+    def get(self, url_suffix: str, query_params: List[tuple[str, str]] = None) -> 'Response':
+        return self.request('GET', self.build_url(url_suffix, query_params))
+
+    def post(self, url_suffix: str, body: dict) -> 'Response':
+        return self.request('POST', self.build_url(url_suffix), data=body)
+
+    def fetch_my_account(self) -> dict:
+        response = self.request('GET', self.api_url + FETCH_ACCOUNT_URL)
+        check_response(response)
+        return response.json()
+
+    def fetch_member(self, member_id: str) -> dict:
+        response = self.get(FETCH_MEMBER_URL_FORMAT.format(member_id))
+        check_response(response)
+        return response.json()
+
+    def chunk_task_ids(self, task_ids: List[int]) -> List[List[int]]:
+        """
+        Splits IDs into chunks which each fit within the ID count and URL length budgets.
+        """
+        base_url_length = len(self.build_url(FETCH_TASKS_URL, [('filter[]=id', '')]))
+        chunks: List[List[int]] = []
+        chunk: List[int] = []
+        url_length = base_url_length
+        for task_id in task_ids:
+            id_length = len(str(task_id)) + (1 if len(chunk) > 0 else 0)
+            if len(chunk) > 0 and (len(chunk) >= self.max_ids_per_request or url_length + id_length > self.max_url_length):
+                chunks.append(chunk)
+                chunk = []
+                url_length = base_url_length
+                id_length = len(str(task_id))
+            chunk.append(task_id)
+            url_length += id_length
+        if len(chunk) > 0:
+            chunks.append(chunk)
+        return chunks
+
+    def fetch_task_chunk(self, task_ids: List[int]) -> List[dict]:
+        query_params: List[tuple[str, str]] = [('filter[]=id', ','.join(map(str, task_ids)))]
+
+        response = self.get(FETCH_TASKS_URL, query_params)
+        check_response(response)
+        return response.json()
+
+    def fetch_tasks_by_ids(self, task_ids: List[int]) -> dict:
+        chunks = self.chunk_task_ids(list(dict.fromkeys(task_ids)))
+        if len(chunks) == 0:
+            return []
+        elif len(chunks) == 1:
+            return self.fetch_task_chunk(chunks[0])
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(chunks))) as executor:
+            chunk_results = list(executor.map(self.fetch_task_chunk, chunks))
+
+        # Chunks should not overlap, but de-duplicate in case the API returns a task more than once
+        tasks: Dict[int, dict] = {}
+        for chunk_tasks in chunk_results:
+            for task in chunk_tasks:
+                tasks.setdefault(task['id'], task)
+        return list(tasks.values())
+
+    def fetch_upcoming_tasks(self, limit: int, offset: int = 0) -> dict:
+        query_params: List[tuple[str, str]] = [('flat', True), ('limit', limit)]
+        if offset > 0:
+            query_params.append(('offset', offset))
+
+        response = self.get(FETCH_UPCOMING_TASKS_URL, query_params)
+        check_response(response)
+        return response.json()
+
+    def iter_upcoming_tasks(self, page_size: int = DEFAULT_UPCOMING_TASKS_PAGE_SIZE, first_page: List[dict] = None) -> Iterator[dict]:
+        """
+        Yields upcoming tasks in priority order, only requesting the next page once the previous one is consumed, so
+        callers can stop early without downloading the rest of the queue. A first page fetched in advance with the same
+        page size can be passed in to skip its request.
+        """
+        offset = 0
+        seen_task_ids = set()
+        while True:
+            page = first_page if offset == 0 and first_page is not None else self.fetch_upcoming_tasks(page_size, offset)
+            new_tasks = [task for task in page if task['id'] not in seen_task_ids]
+            yield from new_tasks
+            if len(page) < page_size:
+                return
+
+            # A server ignoring offset would repeat the same page forever, so once a page adds nothing the rest of the
+            # queue is read with one larger request instead
+            if len(new_tasks) == 0:
+                if offset < UNPAGED_UPCOMING_TASKS_LIMIT:
+                    yield from [task for task in self.fetch_upcoming_tasks(UNPAGED_UPCOMING_TASKS_LIMIT) if task['id'] not in seen_task_ids]
+                return
+            seen_task_ids.update([task['id'] for task in new_tasks])
+            offset += len(page)
+
+    def post_timesheet_entry(self, task_id: int, body: dict):
+        post_url = POST_TIMESHEET_URL_FORMAT.format(task_id)
+        response = self.post(post_url, body)
+        check_response(response)
+        return response.json()
+
+
+def check_response(response: 'Response'):
     if response.status_code != 200:
-        raise Exception(f'Response Error: {response.text}')
+        raise LiquidPlannerError(response)
+
+
+_client: LiquidPlannerClient = None
+_client_lock = threading.Lock()
+
+def get_client() -> LiquidPlannerClient:
+    """
+    Returns the shared client, creating it from the env.py credentials on first use.
+    """
+    global _client
+    if _client is None:
+        # Background requests may ask for the client at the same time as the main thread
+        with _client_lock:
+            if _client is None:
+                from env import LIQUID_PLANNER_EMAIL, LIQUID_PLANNER_PASSWORD
+                _client = LiquidPlannerClient(LIQUID_PLANNER_EMAIL, LIQUID_PLANNER_PASSWORD)
+    return _client
+
+def set_client(client: LiquidPlannerClient):
+    global _client
+    _client = client
+
+def build_url(url_suffix: str, query_params: List[tuple[str, str]] = None) -> str:
+    return get_client().build_url(url_suffix, query_params)
+
+def get(url_suffix: str, query_params: List[tuple[str, str]] = None) -> 'Response':
+    return get_client().get(url_suffix, query_params)
+
+def post(url_suffix: str, body: dict) -> 'Response':
+    return get_client().post(url_suffix, body)
+
+def fetch_my_account() -> dict:
+    return get_client().fetch_my_account()
+
+def fetch_member(member_id: str) -> dict:
+    return get_client().fetch_member(member_id)
+
+def fetch_tasks_by_ids(task_ids: List[int]) -> dict:
+    return get_client().fetch_tasks_by_ids(task_ids)
 
-    return response.json()
+def fetch_upcoming_tasks(limit: int, offset: int = 0) -> dict:
+    return get_client().fetch_upcoming_tasks(limit, offset)
+
+def iter_upcoming_tasks(page_size: int = DEFAULT_UPCOMING_TASKS_PAGE_SIZE, first_page: List[dict] = None) -> Iterator[dict]:
+    return get_client().iter_upcoming_tasks(page_size, first_page)
+
+def post_timesheet_entry(task_id: int, body: dict):
+    return get_client().post_timesheet_entry(task_id, body)
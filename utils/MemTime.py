@@ -1,23 +1,130 @@
 import sqlite3
 import json
 import os
-from typing import List
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
 
 from models.TimesheetEntry import TimesheetEntry
 from models.Project import Project
 from models.Task import Task
-from utils.Util import get_epoch_from_datetime
+from utils.Profiler import span
+from utils.Util import get_epoch_from_datetime, get_state_path
 
 
+DATABASE_PATH_ENV = 'MEMTIME_DATABASE_PATH'
+DATABASE_PATH_HINT_FILENAME = 'database_path.txt'
 DATABASE_PATH_PREFIX = os.path.join(os.path.expanduser('~'), 'AppData', 'Local', 'memtime', 'user')
 DATABASE_FILENAME = 'connected-app.tb-private-local-projects.db'
+# Live reads share the connection used for writes. Read-only reads use a separate connection which can never take a
+# write lock, and snapshot reads run against an in-memory copy taken with the backup API.
+READ_MODE_LIVE = 'live'
+READ_MODE_READONLY = 'readonly'
+READ_MODE_SNAPSHOT = 'snapshot'
+READ_MODES = [READ_MODE_LIVE, READ_MODE_READONLY, READ_MODE_SNAPSHOT]
+
 ENTITY_PROJECT_TYPE = 'project'
 ENTITY_TASK_TYPE = 'task'
 
 SHARED_TIME_NAME = 'Shared Time'
 SHARED_TIME_COLOR = '#AC1457'
 
-def find_database_path() -> str:
+# Query strings are kept constant so sqlite3's per-connection statement cache can reuse the prepared statements
+QUERY_TIME_ENTRIES = '''
+    SELECT entity, start, end, json_extract(timeEntryFields, '$.entity.entityType'), json_extract(timeEntryFields, '$.entity.label')
+    FROM timeEntry
+    WHERE start >= ? AND start < ? AND end >= ? AND end < ?
+'''
+QUERY_TIME_TOTALS = '''
+    SELECT entity, SUM(end - start)
+    FROM timeEntry
+    WHERE start >= ? AND start < ? AND end >= ? AND end < ?
+    GROUP BY entity
+'''
+# rowid identifies each entry across polls, so edits to an entry which was already read can be detected
+QUERY_TIME_ENTRY_DURATIONS_ENDED_AFTER = '''
+    SELECT rowid, entity, end, end - start
+    FROM timeEntry
+    WHERE end > ?
+'''
+# Day ranges are passed as a JSON array of [start, end) epoch pairs, one bucket per pair
+QUERY_DAILY_TIME_TOTALS = '''
+    SELECT json_extract(day.value, '$[0]') AS day_start, entry.entity, SUM(entry.end - entry.start)
+    FROM json_each(?) AS day
+    JOIN timeEntry AS entry
+        ON entry.start >= json_extract(day.value, '$[0]') AND entry.start < json_extract(day.value, '$[1]')
+        AND entry.end >= json_extract(day.value, '$[0]') AND entry.end < json_extract(day.value, '$[1]')
+    GROUP BY day_start, entry.entity
+'''
+QUERY_PROJECTS = '''
+    SELECT id, name, description, isActive
+    FROM entity
+    WHERE type = ?
+'''
+QUERY_PROJECTS_BY_NAME = '''
+    SELECT id, name, description, isActive
+    FROM entity
+    WHERE type = ? AND name = ?
+'''
+QUERY_TASKS = '''
+    SELECT id, name, description, parentId, isActive
+    FROM entity
+    WHERE type = ?
+'''
+# Entity IDs are passed as a single JSON array so the statement text does not change with the number of IDs
+QUERY_TASKS_BY_IDS = '''
+    SELECT id, name, description, parentId, isActive
+    FROM entity
+    WHERE type = ? AND id IN (SELECT value FROM json_each(?))
+'''
+QUERY_TASKS_BY_NAME = '''
+    SELECT id, name, description, parentId, isActive
+    FROM entity
+    WHERE name = ? AND type = ?
+'''
+INSERT_ENTITY = '''
+    INSERT INTO entity (parentId, name, description, color, keywords, labels, isActive, type, config, createdAt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+UPDATE_ENTITY_NAME = '''
+    UPDATE entity
+    SET name = ?
+    WHERE id = ?
+'''
+UPDATE_ENTITY_PARENT = '''
+    UPDATE entity
+    SET parentId = ?
+    WHERE id = ?
+'''
+UPDATE_ENTITY_IS_ACTIVE = '''
+    UPDATE entity
+    SET isActive = ?
+    WHERE id = ?
+'''
+
+_database_path: str = None
+_snapshot_ids = itertools.count(1)
+
+def is_valid_database_path(path: str) -> bool:
+    return path is not None and path.endswith(DATABASE_FILENAME) and os.path.isfile(path)
+
+def read_database_path_hint() -> str:
+    try:
+        with open(get_state_path(DATABASE_PATH_HINT_FILENAME)) as hint_file:
+            return hint_file.read().strip()
+    except OSError:
+        return None
+
+def write_database_path_hint(path: str):
+    try:
+        with open(get_state_path(DATABASE_PATH_HINT_FILENAME), 'w') as hint_file:
+            hint_file.write(path)
+    except OSError:
+        # The hint is only an optimisation, so failing to persist it should not stop the run
+        pass
+
+def walk_database_path() -> str:
     """
     Recursively searches for the database filename as the directory path may be different per user. Returns full path.
     """
@@ -27,168 +134,352 @@ def find_database_path() -> str:
                 return os.path.join(root, filename)
     return None
 
-def query_time_entries(start_epoch: int, end_epoch: int) -> List[TimesheetEntry]:
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
-
-    query = '''
-        SELECT entity, start, end, timeEntryFields
-        FROM timeEntry
-        WHERE start >= ? AND start < ? AND end >= ? AND end < ?
-    '''
-
-    res = cursor.execute(query, (start_epoch, end_epoch, start_epoch, end_epoch))
-
-    time_entries: List[TimesheetEntry] = []
-    for entry in res:
-        task_id, start_epoch, end_epoch, body = entry
-        entity = json.loads(body)['entity']
-        entry = TimesheetEntry(task_id, entity['entityType'], entity['label'], int(start_epoch), int(end_epoch))
-        time_entries.append(entry)
-
-    conn.close()
-    return time_entries
+def find_database_path(override_path: str = None) -> str:
+    """
+    Returns the path of the MemTime database. An explicit override (CLI flag, then MEMTIME_DATABASE_PATH) is used as-is.
+    Otherwise the path is memoised for the process and persisted to a hint file, and the directory walk is only
+    performed when the hinted path no longer exists.
+    """
+    global _database_path
 
-def query_projects(name: str = None) -> List[Project]:
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
+    override_path = override_path or os.environ.get(DATABASE_PATH_ENV)
+    if override_path:
+        return override_path
 
-    where_clause = 'WHERE type = ?'
-    params = [ENTITY_PROJECT_TYPE]
-    if name is not None:
-        where_clause += ' AND name = ?'
-        params += [name]
+    if _database_path is not None and os.path.isfile(_database_path):
+        return _database_path
 
-    query = f'''
-        SELECT id, name, description, isActive
-        FROM entity
-        {where_clause}
-    '''
+    path = read_database_path_hint()
+    if not is_valid_database_path(path):
+        with span('memtime.walk_database_path') as trace_span:
+            path = walk_database_path()
+            trace_span.set(found=path is not None)
+        if path is not None:
+            write_database_path_hint(path)
 
-    res = cursor.execute(query, params)
+    _database_path = path
+    return path
 
-    projects: List[Project] = []
-    for entity in res:
-        id, label, description, is_active_int = entity
-        is_active = is_active_int == 1
-        projects.append(Project(id, label, description, is_active))
+def build_task(entity: tuple) -> Task:
+    id, label, liquid_planner_url, parent_id, is_active_int = entity
+    is_active = is_active_int == 1
+    return Task(id, label, liquid_planner_url, parent_id, is_active)
 
-    conn.close()
-    return projects
+def build_project(entity: tuple) -> Project:
+    id, label, description, is_active_int = entity
+    is_active = is_active_int == 1
+    return Project(id, label, description, is_active)
 
-def query_tasks(entity_ids: List[int] = None) -> List[Task]:
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
-
-    where_clause = 'WHERE type = ?'
-    params = [ENTITY_TASK_TYPE]
-    if entity_ids is not None:
-        where_clause += f' AND id in ({",".join(["?"] * len(entity_ids))})'
-        params += entity_ids
-
-    query = f'''
-        SELECT id, name, description, parentId, isActive
-        FROM entity
-        {where_clause}
-    '''
-
-    res = cursor.execute(query, params)
-
-    tasks: List[Task] = []
-    for entity in res:
-        id, label, liquid_planner_url, parent_id, is_active_int = entity
-        is_active = is_active_int == 1
-        task = Task(id, label, liquid_planner_url, parent_id, is_active)
-        tasks.append(task)
-    
-    conn.close()
-    return tasks
 
-def query_task_by_name(name: str) -> List[Task]:
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
+class MemTimeDatabase:
+    """
+    Long-lived access to the MemTime database. The database path is resolved once, and each thread using the
+    repository gets its own connection which is reused for every query until close() is called.
 
-    values = [name, ENTITY_TASK_TYPE]
+    read_mode chooses how queries reach the database while MemTime itself may be writing to it (see READ_MODES). Writes
+    always go to the live database, and a snapshot is retaken after each write so reads see the change.
+    """
+    def __init__(self, database_path: str = None, read_mode: str = READ_MODE_LIVE):
+        self.database_path = find_database_path(database_path)
+        self.read_mode = read_mode
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._read_connections: Dict[int, sqlite3.Connection] = {}
+        self._snapshot_uri: str = None
+        self._snapshot_keeper: sqlite3.Connection = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'MemTimeDatabase':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def check_database_path(self):
+        if self.database_path is None:
+            raise FileNotFoundError(f'Could not find MemTime database "{DATABASE_FILENAME}" in {DATABASE_PATH_PREFIX}')
+        # sqlite3 would otherwise create an empty database at a mistyped path
+        if not os.path.isfile(self.database_path):
+            raise FileNotFoundError(f'MemTime database "{self.database_path}" does not exist')
+
+    def get_read_only_uri(self) -> str:
+        from pathlib import Path
+        return f'{Path(self.database_path).absolute().as_uri()}?mode=ro'
+
+    def connection(self) -> sqlite3.Connection:
+        thread_id = threading.get_ident()
+        with self._lock:
+            conn = self._connections.get(thread_id)
+            if conn is None:
+                self.check_database_path()
+                # Connections are only used by the thread that created them, but may be closed by another thread
+                conn = sqlite3.connect(self.database_path, check_same_thread=False)
+                self._connections[thread_id] = conn
+            return conn
+
+    def read_connection(self) -> sqlite3.Connection:
+        if self.read_mode == READ_MODE_LIVE:
+            return self.connection()
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            conn = self._read_connections.get(thread_id)
+            if conn is None:
+                self.check_database_path()
+                if self.read_mode == READ_MODE_SNAPSHOT:
+                    if self._snapshot_uri is None:
+                        self.take_snapshot()
+                    conn = sqlite3.connect(self._snapshot_uri, uri=True, check_same_thread=False)
+                else:
+                    conn = sqlite3.connect(self.get_read_only_uri(), uri=True, check_same_thread=False)
+                self._read_connections[thread_id] = conn
+            return conn
+
+    def take_snapshot(self):
+        # A named shared-cache memory database lets every thread open its own connection to the same copy. The keeper
+        # connection holds the copy in memory until the snapshot is released.
+        self._snapshot_uri = f'file:memtime-snapshot-{next(_snapshot_ids)}?mode=memory&cache=shared'
+        self._snapshot_keeper = sqlite3.connect(self._snapshot_uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(self.get_read_only_uri(), uri=True)
+        try:
+            with span('memtime.take_snapshot') as trace_span:
+                source.backup(self._snapshot_keeper)
+                trace_span.set(bytes=os.path.getsize(self.database_path))
+        finally:
+            source.close()
+
+    def release_read_connections(self):
+        with self._lock:
+            for conn in self._read_connections.values():
+                conn.close()
+            self._read_connections.clear()
+            if self._snapshot_keeper is not None:
+                self._snapshot_keeper.close()
+                self._snapshot_keeper = None
+                self._snapshot_uri = None
+
+    def close(self):
+        self.release_read_connections()
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def query_time_entries(self, start_epoch: int, end_epoch: int) -> List[TimesheetEntry]:
+        with span('memtime.query_time_entries') as trace_span:
+            res = self.read_connection().execute(QUERY_TIME_ENTRIES, (start_epoch, end_epoch, start_epoch, end_epoch))
+
+            time_entries: List[TimesheetEntry] = []
+            for entry in res:
+                task_id, start_epoch, end_epoch, entity_type, label = entry
+                entry = TimesheetEntry(task_id, entity_type, label, int(start_epoch), int(end_epoch))
+                time_entries.append(entry)
+
+            trace_span.set(rows=len(time_entries))
+            return time_entries
+
+    def query_time_totals(self, start_epoch: int, end_epoch: int) -> Dict[int, int]:
+        """
+        Returns the total logged seconds per entity ID, aggregated by SQLite rather than building each entry.
+        """
+        with span('memtime.query_time_totals') as trace_span:
+            res = self.read_connection().execute(QUERY_TIME_TOTALS, (start_epoch, end_epoch, start_epoch, end_epoch))
+            time_totals = {entity_id: int(total_secs) for entity_id, total_secs in res}
+            trace_span.set(rows=len(time_totals))
+            return time_totals
+
+    def query_time_entry_durations_ended_after(self, after_epoch: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Returns (rowid, entity ID, end epoch, logged seconds) for every entry which ended after after_epoch. Used to
+        read new and edited entries past a high-water mark.
+        """
+        with span('memtime.query_time_entry_durations_ended_after') as trace_span:
+            res = self.read_connection().execute(QUERY_TIME_ENTRY_DURATIONS_ENDED_AFTER, (after_epoch,))
+            durations = [(rowid, entity_id, int(end_epoch), int(time_secs)) for rowid, entity_id, end_epoch, time_secs in res]
+            trace_span.set(rows=len(durations))
+            return durations
+
+    def query_daily_time_totals(self, day_ranges: List[Tuple[int, int]]) -> Dict[int, Dict[int, int]]:
+        """
+        Returns the total logged seconds per entity ID for each (start, end) epoch range, keyed by the range start.
+        """
+        with span('memtime.query_daily_time_totals', days=len(day_ranges)) as trace_span:
+            res = self.read_connection().execute(QUERY_DAILY_TIME_TOTALS, (json.dumps([list(day_range) for day_range in day_ranges]),))
+
+            daily_totals: Dict[int, Dict[int, int]] = {day_start: {} for day_start, _ in day_ranges}
+            row_count = 0
+            for day_start, entity_id, total_secs in res:
+                daily_totals[day_start][entity_id] = int(total_secs)
+                row_count += 1
+
+            trace_span.set(rows=row_count)
+            return daily_totals
+
+    def query_projects(self, name: str = None) -> List[Project]:
+        with span('memtime.query_projects') as trace_span:
+            if name is None:
+                res = self.read_connection().execute(QUERY_PROJECTS, (ENTITY_PROJECT_TYPE,))
+            else:
+                res = self.read_connection().execute(QUERY_PROJECTS_BY_NAME, (ENTITY_PROJECT_TYPE, name))
+
+            projects = [build_project(entity) for entity in res]
+            trace_span.set(rows=len(projects))
+            return projects
+
+    def query_tasks(self, entity_ids: List[int] = None) -> List[Task]:
+        with span('memtime.query_tasks') as trace_span:
+            if entity_ids is None:
+                res = self.read_connection().execute(QUERY_TASKS, (ENTITY_TASK_TYPE,))
+            else:
+                res = self.read_connection().execute(QUERY_TASKS_BY_IDS, (ENTITY_TASK_TYPE, json.dumps(list(entity_ids))))
+
+            tasks = [build_task(entity) for entity in res]
+            trace_span.set(rows=len(tasks))
+            return tasks
+
+    def query_task_by_name(self, name: str) -> List[Task]:
+        with span('memtime.query_task_by_name') as trace_span:
+            res = self.read_connection().execute(QUERY_TASKS_BY_NAME, (name, ENTITY_TASK_TYPE))
+            tasks = [build_task(entity) for entity in res]
+            trace_span.set(rows=len(tasks))
+            return tasks
+
+    @contextmanager
+    def write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Applies every write made inside the block in a single transaction, rolling all of them back if any fails. The
+        write lock is taken up front, so a busy database fails before anything is written rather than part way through.
+        """
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if self.read_mode == READ_MODE_SNAPSHOT:
+            self.release_read_connections()
+
+    def insert_entities(self, entities: List[Tuple[bool, int, str, str, str]]) -> List[int]:
+        """
+        Inserts (is_project, parent_id, name, description, color) entities in one transaction, returning their IDs in
+        the same order.
+        """
+        keywords = None
+        labels = '[]'
+        is_active = 1
+        # Uses double-quotes intentionally to match formatting of MemTime DB
+        config = str({
+            "showActivityField": True,  # TODO: Test these options.
+            "showBillableField": True,
+            "defaultBillability": "inherit",
+            "defaultActivity": None
+        })
+        created_at = get_epoch_from_datetime()
+
+        # Rows are inserted one statement at a time as each new ID is needed, but share a single commit
+        entity_ids: List[int] = []
+        with span('memtime.insert_entities', rows=len(entities)), self.write_transaction() as conn:
+            for is_project, parent_id, name, description, color in entities:
+                entity_type = ENTITY_PROJECT_TYPE if is_project else ENTITY_TASK_TYPE
+                values = [parent_id, name, description, color, keywords, labels, is_active, entity_type, config, created_at]
+                entity_ids.append(conn.execute(INSERT_ENTITY, values).lastrowid)
+
+        return entity_ids
+
+    def insert_entity(self, is_project: bool, parent_id: int, name: str, description: str, color: str = None) -> int:
+        return self.insert_entities([(is_project, parent_id, name, description, color)])[0]
+
+    def set_entity_names(self, names: List[Tuple[int, str]]):
+        """
+        Renames (id, name) entities in one transaction.
+        """
+        with span('memtime.set_entity_names', rows=len(names)), self.write_transaction() as conn:
+            conn.executemany(UPDATE_ENTITY_NAME, [(name, id) for id, name in names])
+
+    def set_entity_name(self, id: int, name: str):
+        self.set_entity_names([(id, name)])
+
+    def set_entity_parents(self, parents: List[Tuple[int, int]]):
+        """
+        Moves (id, parent_id) entities in one transaction.
+        """
+        with span('memtime.set_entity_parents', rows=len(parents)), self.write_transaction() as conn:
+            conn.executemany(UPDATE_ENTITY_PARENT, [(parent_id, id) for id, parent_id in parents])
+
+    def set_entities_is_active(self, ids: List[int], is_active: bool):
+        is_active_value = 1 if is_active else 0
+        with span('memtime.set_entities_is_active', rows=len(ids)), self.write_transaction() as conn:
+            conn.executemany(UPDATE_ENTITY_IS_ACTIVE, [(is_active_value, id) for id in ids])
+
+    def set_entity_is_active(self, id: int, is_active: bool):
+        self.set_entities_is_active([id], is_active)
+
+
+_database: MemTimeDatabase = None
+
+def get_database() -> MemTimeDatabase:
+    """
+    Returns the shared database opened by open_database(), or a lazily created one if no run has opened it.
+    """
+    global _database
+    if _database is None:
+        _database = MemTimeDatabase()
+    return _database
 
-    query = f'''
-        SELECT id, name, description, parentId, isActive
-        FROM entity
-        WHERE name = ? AND type = ?
-    '''
+@contextmanager
+def open_database(database_path: str = None, read_mode: str = READ_MODE_LIVE) -> Iterator[MemTimeDatabase]:
+    """
+    Opens the shared database for the duration of a script run, closing all of its connections on exit.
+    """
+    global _database
+    previous_database = _database
+    _database = MemTimeDatabase(database_path, read_mode)
+    try:
+        yield _database
+    finally:
+        _database.close()
+        _database = previous_database
 
-    res = cursor.execute(query, values)
+def query_time_entries(start_epoch: int, end_epoch: int) -> List[TimesheetEntry]:
+    return get_database().query_time_entries(start_epoch, end_epoch)
 
-    tasks: List[Task] = []
-    for entity in res:
-        id, label, liquid_planner_url, parent_id, is_active_int = entity
-        is_active = is_active_int == 1
-        task = Task(id, label, liquid_planner_url, parent_id, is_active)
-        tasks.append(task)
-    
-    conn.close()
-    return tasks
+def query_time_totals(start_epoch: int, end_epoch: int) -> Dict[int, int]:
+    return get_database().query_time_totals(start_epoch, end_epoch)
 
-def insert_entity(is_project: bool, parent_id: int, name: str, description: str, color: str = None) -> int:
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
+def query_time_entry_durations_ended_after(after_epoch: int) -> List[Tuple[int, int, int, int]]:
+    return get_database().query_time_entry_durations_ended_after(after_epoch)
 
-    entity_type = ENTITY_PROJECT_TYPE if is_project else ENTITY_TASK_TYPE
-    keywords = None
-    labels = '[]'
-    is_active = 1
-    # Uses double-quotes intentionally to match formatting of MemTime DB
-    config = str({
-        "showActivityField": True,  # TODO: Test these options.
-        "showBillableField": True,
-        "defaultBillability": "inherit",
-        "defaultActivity": None
-    })
-    created_at = get_epoch_from_datetime()
+def query_daily_time_totals(day_ranges: List[Tuple[int, int]]) -> Dict[int, Dict[int, int]]:
+    return get_database().query_daily_time_totals(day_ranges)
 
-    values = [parent_id, name, description, color, keywords, labels, is_active, entity_type, config, created_at]
+def query_projects(name: str = None) -> List[Project]:
+    return get_database().query_projects(name)
 
-    query = f'''
-        INSERT INTO entity (parentId, name, description, color, keywords, labels, isActive, type, config, createdAt)
-        VALUES ({','.join(['?'] * len(values))})
-    '''
+def query_tasks(entity_ids: List[int] = None) -> List[Task]:
+    return get_database().query_tasks(entity_ids)
 
-    res = cursor.execute(query, values)
-    conn.commit()
+def query_task_by_name(name: str) -> List[Task]:
+    return get_database().query_task_by_name(name)
 
-    memtime_id = res.lastrowid
+def insert_entity(is_project: bool, parent_id: int, name: str, description: str, color: str = None) -> int:
+    return get_database().insert_entity(is_project, parent_id, name, description, color)
 
-    conn.close()
-    return memtime_id
+def insert_entities(entities: List[Tuple[bool, int, str, str, str]]) -> List[int]:
+    return get_database().insert_entities(entities)
 
 def set_entity_name(id: int, name: str):
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
+    get_database().set_entity_name(id, name)
 
-    values = [name, id]
+def set_entity_names(names: List[Tuple[int, str]]):
+    get_database().set_entity_names(names)
 
-    query = f'''
-        UPDATE entity
-        SET name = ?
-        WHERE id = ?
-    '''
-
-    _ = cursor.execute(query, values)
-    conn.commit()
-    conn.close()
+def set_entity_parents(parents: List[Tuple[int, int]]):
+    get_database().set_entity_parents(parents)
 
 def set_entity_is_active(id: int, is_active: bool):
-    conn = sqlite3.connect(find_database_path())
-    cursor = conn.cursor()
-
-    is_active_value = 1 if is_active else 0
-    values = [is_active_value, id]
-
-    query = f'''
-        UPDATE entity
-        SET isActive = ?
-        WHERE id = ?
-    '''
+    get_database().set_entity_is_active(id, is_active)
 
-    _ = cursor.execute(query, values)
-    conn.commit()
-    conn.close()
+def set_entities_is_active(ids: List[int], is_active: bool):
+    get_database().set_entities_is_active(ids, is_active)
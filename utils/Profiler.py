@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from typing import Dict, List
+
+PROFILE_FORMAT_JSON = 'json'
+PROFILE_FORMAT_CHROME = 'chrome'
+
+_enabled = False
+_start_time = 0.0
+_spans: List['Span'] = []
+
+
+class Span:
+    """
+    A timed section of a run. Attributes such as row counts, bytes and status codes can be added with set() until the
+    span ends.
+    """
+    __slots__ = ('name', 'attributes', 'thread_id', 'start_time', 'duration_secs')
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.start_time = 0.0
+        self.duration_secs = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, *_):
+        self.duration_secs = time.perf_counter() - self.start_time
+        if error_type is not None:
+            self.attributes['error'] = error_type.__name__
+        # list.append is atomic, so spans can be recorded from worker threads without a lock
+        _spans.append(self)
+
+
+class NoopSpan:
+    """
+    Returned by span() while profiling is disabled, so instrumented code costs one call and one flag check.
+    """
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self) -> 'NoopSpan':
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_noop_span = NoopSpan()
+
+def enable_profiling():
+    global _enabled, _start_time
+    _enabled = True
+    _start_time = time.perf_counter()
+    _spans.clear()
+
+def is_profiling() -> bool:
+    return _enabled
+
+def span(name: str, **attributes):
+    if not _enabled:
+        return _noop_span
+    return Span(name, attributes)
+
+def get_spans() -> List[Span]:
+    return list(_spans)
+
+def get_phase_breakdown() -> Dict[str, dict]:
+    """
+    Returns the count, total and slowest duration of the spans with each name, slowest total first.
+    """
+    phases: Dict[str, dict] = {}
+    for recorded_span in get_spans():
+        phase = phases.setdefault(recorded_span.name, {'count': 0, 'total_secs': 0.0, 'max_secs': 0.0})
+        phase['count'] += 1
+        phase['total_secs'] += recorded_span.duration_secs
+        phase['max_secs'] = max(phase['max_secs'], recorded_span.duration_secs)
+    return dict(sorted(phases.items(), key=lambda item: item[1]['total_secs'], reverse=True))
+
+def print_phase_breakdown():
+    print(f'\nProfile ({round((time.perf_counter() - _start_time) * 1000, 1)} ms total):')
+    for name, phase in get_phase_breakdown().items():
+        print(f'\t{name.ljust(40)} {str(phase["count"]).rjust(5)}x {round(phase["total_secs"] * 1000, 1):10} ms (max {round(phase["max_secs"] * 1000, 1)} ms)')
+
+def write_profile(path: str, profile_format: str = PROFILE_FORMAT_CHROME):
+    """
+    Writes every span to path, either as a list of spans or in the Chrome trace event format, which can be opened in
+    chrome://tracing or Perfetto.
+    """
+    spans = get_spans()
+    if profile_format == PROFILE_FORMAT_CHROME:
+        data = {
+            'traceEvents': [{
+                'name': recorded_span.name,
+                'ph': 'X',
+                'ts': round((recorded_span.start_time - _start_time) * 1000000, 1),
+                'dur': round(recorded_span.duration_secs * 1000000, 1),
+                'pid': 1,
+                'tid': recorded_span.thread_id,
+                'args': recorded_span.attributes
+            } for recorded_span in spans],
+            'displayTimeUnit': 'ms'
+        }
+    else:
+        data = [{
+            'name': recorded_span.name,
+            'start_secs': round(recorded_span.start_time - _start_time, 6),
+            'duration_secs': round(recorded_span.duration_secs, 6),
+            'thread_id': recorded_span.thread_id,
+            **recorded_span.attributes
+        } for recorded_span in spans]
+
+    with open(path, 'w') as profile_file:
+        json.dump(data, profile_file, default=str)
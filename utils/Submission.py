@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Dict, List
+
+from models.TimesheetSubmission import TimesheetSubmission, STATUS_POSTED, STATUS_FAILED, STATUS_SKIPPED
+from utils.LiquidPlanner import LiquidPlannerError, get_client, post_timesheet_entry, POST_RETRY_STATUS_CODES
+from utils.SubmissionLedger import SubmissionLedger, get_ledger_key
+
+
+DEFAULT_MAX_CONCURRENCY = 6
+THROTTLED_STATUS_CODE = 429
+CLIENT_ERROR_STATUS_CODES = range(400, 500)
+CHECK_MANUALLY_MESSAGE = 'LiquidPlanner may have recorded this entry, check it before posting it again'
+
+class AdaptiveLimiter:
+    """
+    Limits the number of in-flight requests, halving the limit whenever LiquidPlanner throttles a request and
+    growing it back by one for each request which was not throttled.
+    """
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+
+    def release(self, throttled: bool):
+        with self._condition:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1)
+            self._condition.notify_all()
+
+def post_submission(submission: TimesheetSubmission, limiter: AdaptiveLimiter, ledger: SubmissionLedger = None):
+    limiter.acquire()
+    throttled = False
+    start_time = time.perf_counter()
+    try:
+        submission.attempts += 1
+        post_timesheet_entry(submission.liquid_planner_id, submission.body)
+        submission.status = STATUS_POSTED
+        submission.error = None
+        if ledger is not None:
+            ledger.record(get_ledger_key(submission.date, submission.memtime_task_id, submission.liquid_planner_id), submission.body['work'])
+    except LiquidPlannerError as error:
+        throttled = error.status_code == THROTTLED_STATUS_CODE
+        submission.status = STATUS_FAILED
+        submission.error = str(error)
+        # Posting time is not idempotent, so an entry is only posted again when it was definitely not processed
+        submission.retryable = error.status_code in POST_RETRY_STATUS_CODES
+        if error.status_code not in CLIENT_ERROR_STATUS_CODES:
+            submission.error += f' ({CHECK_MANUALLY_MESSAGE})'
+    except Exception as error:
+        import requests
+        submission.status = STATUS_FAILED
+        submission.error = str(error) or type(error).__name__
+        # Only a connection which was never made is known not to have reached LiquidPlanner
+        submission.retryable = isinstance(error, requests.ConnectTimeout)
+        if not submission.retryable:
+            submission.error += f' ({CHECK_MANUALLY_MESSAGE})'
+    finally:
+        submission.latency_secs = time.perf_counter() - start_time
+        retry_count = get_client().get_last_retry_count()
+        submission.retries += retry_count
+        limiter.release(throttled or retry_count > 0)
+
+def post_task_submissions(submissions: List[TimesheetSubmission], limiter: AdaptiveLimiter, ledger: SubmissionLedger = None):
+    # Entries for one task are posted in date order, as each post sets the task's remaining effort
+    for index, submission in enumerate(submissions):
+        post_submission(submission, limiter, ledger)
+        if not submission.is_posted():
+            for skipped_submission in submissions[index + 1:]:
+                skipped_submission.status = STATUS_SKIPPED
+                skipped_submission.error = f'Earlier entry for "{submission.label}" failed'
+                skipped_submission.retryable = submission.retryable
+            return
+
+def submit_timesheet_entries(submissions: List[TimesheetSubmission], max_concurrency: int = DEFAULT_MAX_CONCURRENCY, ledger: SubmissionLedger = None) -> List[TimesheetSubmission]:
+    """
+    Posts every submission which has not already been posted and has not failed permanently, running separate
+    LiquidPlanner tasks concurrently.
+    Submissions are updated in place with their status, attempts, retries and latency, and each successful post is
+    recorded in the ledger if one is given.
+    """
+    submissions_by_task: Dict[int, List[TimesheetSubmission]] = {}
+    for submission in submissions:
+        if submission.is_retryable():
+            submissions_by_task.setdefault(submission.liquid_planner_id, []).append(submission)
+
+    if len(submissions_by_task) > 0:
+        from concurrent.futures import ThreadPoolExecutor
+        limiter = AdaptiveLimiter(max_concurrency)
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(submissions_by_task))) as executor:
+            for task_submissions in submissions_by_task.values():
+                task_submissions.sort(key=lambda submission: submission.date)
+                executor.submit(post_task_submissions, task_submissions, limiter, ledger)
+
+    return submissions
+
+def print_submission_report(submissions: List[TimesheetSubmission]):
+    posted_count = len([submission for submission in submissions if submission.is_posted()])
+    print(f'\nSubmitted {posted_count}/{len(submissions)} timesheet entries:')
+    for submission in submissions:
+        print(f'\t{submission} ({submission.attempts} attempt(s), {submission.retries} retries, {round(submission.latency_secs, 2)}s)')
+        if submission.error is not None:
+            print(f'\t\tERROR: {submission.error}')
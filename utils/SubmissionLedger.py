@@ -0,0 +1,94 @@
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from utils.Util import get_state_path
+
+
+LEDGER_FILENAME = 'submission_ledger.jsonl'
+WORK_DECIMALS = 2
+
+LedgerKey = Tuple[str, int, int]
+
+def get_ledger_key(date: datetime.datetime, memtime_task_id: int, liquid_planner_id: int) -> LedgerKey:
+    return date.strftime('%Y-%m-%d'), memtime_task_id, liquid_planner_id
+
+def get_amount_hash(key: LedgerKey, total_work: float) -> str:
+    import hashlib
+    return hashlib.sha256(f'{key[0]}|{key[1]}|{key[2]}|{total_work:.{WORK_DECIMALS}f}'.encode()).hexdigest()[:16]
+
+
+class SubmissionLedger:
+    """
+    Append-only record of every timesheet entry posted to LiquidPlanner, keyed by (date, MemTime task, LiquidPlanner
+    task). Each line holds the work posted and the total posted for its key afterwards, identified by a hash of the key
+    and that total, so replaying a line twice never double counts.
+
+    Lines are flushed to disk as each post succeeds, so an interrupted run can be resumed by running it again.
+    """
+    def __init__(self, ledger_path: str = None):
+        self.ledger_path = ledger_path or get_state_path(LEDGER_FILENAME)
+        self.posted_work: Dict[LedgerKey, float] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[LedgerKey, float]:
+        if self.posted_work is not None:
+            return self.posted_work
+
+        self.posted_work = {}
+        seen_hashes = set()
+        try:
+            with open(self.ledger_path) as ledger_file:
+                for line in ledger_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave a partial last line
+                        continue
+
+                    if record['amount_hash'] in seen_hashes:
+                        continue
+                    seen_hashes.add(record['amount_hash'])
+
+                    key = (record['date'], record['memtime_task_id'], record['liquid_planner_id'])
+                    self.posted_work[key] = round(self.posted_work.get(key, 0.0) + record['work'], WORK_DECIMALS)
+        except FileNotFoundError:
+            pass
+
+        return self.posted_work
+
+    def get_posted_work(self, key: LedgerKey) -> float:
+        return self.load().get(key, 0.0)
+
+    def record(self, key: LedgerKey, work: float):
+        """
+        Appends a successfully posted amount of work for key. Safe to call from concurrent submission threads.
+        """
+        with self._lock:
+            total_work = round(self.get_posted_work(key) + work, WORK_DECIMALS)
+            record = {
+                'date': key[0],
+                'memtime_task_id': key[1],
+                'liquid_planner_id': key[2],
+                'work': work,
+                'total_work': total_work,
+                'amount_hash': get_amount_hash(key, total_work),
+                'posted_at': time.time()
+            }
+            with open(self.ledger_path, 'a') as ledger_file:
+                ledger_file.write(json.dumps(record) + '\n')
+                ledger_file.flush()
+                os.fsync(ledger_file.fileno())
+            self.posted_work[key] = total_work
+
+
+_submission_ledger: SubmissionLedger = None
+
+def get_submission_ledger() -> SubmissionLedger:
+    global _submission_ledger
+    if _submission_ledger is None:
+        _submission_ledger = SubmissionLedger()
+    return _submission_ledger
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from typing import Dict, List, Union
+
+from models.EntityIndex import EntityIndex
+from models.Project import Project
+from models.Task import Task
+from utils.Util import load_state_json, save_state_json
+
+
+SYNC_STATE_FILENAME = 'refresh_sync_state.json'
+
+_refresh = False
+
+def set_refresh(refresh: bool):
+    """
+    Ignores the recorded sync state for this run when refresh is True, so every record is compared again.
+    """
+    global _refresh
+    _refresh = refresh
+
+def get_fingerprint(*values) -> str:
+    import hashlib
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()[:16]
+
+def get_liquid_planner_task_fingerprint(task_json: dict, member_id: int) -> str:
+    is_done = [assignment['is_done'] for assignment in task_json['assignments'] if assignment['person_id'] == member_id]
+    return get_fingerprint(task_json['name'], task_json['parent_crumbs'], task_json['project_id'], is_done)
+
+def get_liquid_planner_project_fingerprint(name: str) -> str:
+    return get_fingerprint(name)
+
+def get_task_fingerprint(task: Task) -> str:
+    return get_fingerprint(task.label, task.liquid_planner_id, task.parent_id, task.is_active)
+
+def get_project_fingerprint(project: Project) -> str:
+    return get_fingerprint(project.label, project.liquid_planner_id, project.is_active)
+
+
+class SyncState:
+    """
+    Fingerprints of the LiquidPlanner tasks and projects, and of the MemTime entities mapped to them, as they were when
+    a refresh last left them fully reconciled. A record whose fingerprints all match has not changed on either side
+    since, so it does not need to be compared again.
+    """
+    def __init__(self, key: str, data: dict = None):
+        data = data or {}
+        self.key = key
+        self.liquid_planner_tasks: Dict[str, str] = data.get('liquid_planner_tasks', {})
+        self.liquid_planner_projects: Dict[str, str] = data.get('liquid_planner_projects', {})
+        self.memtime_entities: Dict[str, str] = data.get('memtime_entities', {})
+
+    def is_entity_synced(self, entity: Union[Task, Project]) -> bool:
+        fingerprint = get_task_fingerprint(entity) if isinstance(entity, Task) else get_project_fingerprint(entity)
+        return self.memtime_entities.get(str(entity.id)) == fingerprint
+
+    def is_task_synced(self, task_json: dict, member_id: int, entity_index: EntityIndex) -> bool:
+        if self.liquid_planner_tasks.get(str(task_json['id'])) != get_liquid_planner_task_fingerprint(task_json, member_id):
+            return False
+
+        # A task with no MemTime task left still needs creating, and a moved task's old and new projects both matter
+        memtime_tasks = entity_index.get_tasks_by_liquid_planner_id(task_json['id'])
+        if len(memtime_tasks) == 0:
+            return False
+        for memtime_task in memtime_tasks:
+            project = entity_index.get_project(memtime_task.parent_id)
+            if not self.is_entity_synced(memtime_task) or (project is not None and not self.is_entity_synced(project)):
+                return False
+        return True
+
+    def is_project_synced(self, project_id: int, name: str, entity_index: EntityIndex) -> bool:
+        if self.liquid_planner_projects.get(str(project_id)) != get_liquid_planner_project_fingerprint(name):
+            return False
+
+        memtime_projects = entity_index.get_projects_by_liquid_planner_id(project_id)
+        return len(memtime_projects) > 0 and all([self.is_entity_synced(project) for project in memtime_projects])
+
+    def record(self, tasks_json: List[dict], projects: Dict[int, str], member_id: int, entity_index: EntityIndex):
+        """
+        Replaces the state with the given reconciled tasks and (project ID, name) projects, and the current fingerprint
+        of every MemTime entity mapped to LiquidPlanner.
+        """
+        self.liquid_planner_tasks = {str(task_json['id']): get_liquid_planner_task_fingerprint(task_json, member_id) for task_json in tasks_json}
+        self.liquid_planner_projects = {str(project_id): get_liquid_planner_project_fingerprint(name) for project_id, name in projects.items()}
+        self.memtime_entities = {}
+        for task in entity_index.get_tasks():
+            if task.liquid_planner_id is not None:
+                self.memtime_entities[str(task.id)] = get_task_fingerprint(task)
+        for project in entity_index.get_projects():
+            self.memtime_entities[str(project.id)] = get_project_fingerprint(project)
+
+
+def get_sync_state_key(database_path: str, member_id: int) -> str:
+    return f'{os.path.abspath(database_path)}|{member_id}'
+
+def load_sync_state(database_path: str, member_id: int) -> SyncState:
+    key = get_sync_state_key(database_path, member_id)
+    if _refresh:
+        return SyncState(key)
+    return SyncState(key, load_state_json(SYNC_STATE_FILENAME, {}).get(key))
+
+def save_sync_state(sync_state: SyncState):
+    sync_states: dict = load_state_json(SYNC_STATE_FILENAME, {})
+    sync_states[sync_state.key] = {
+        'liquid_planner_tasks': sync_state.liquid_planner_tasks,
+        'liquid_planner_projects': sync_state.liquid_planner_projects,
+        'memtime_entities': sync_state.memtime_entities,
+        'synced_at': time.time()
+    }
+    save_state_json(SYNC_STATE_FILENAME, sync_states)
@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from utils.LiquidPlanner import fetch_tasks_by_ids
+from utils.Profiler import span
+from utils.Util import get_state_path
+
+
+CACHE_FILENAME = 'liquid_planner_cache.db'
+SECONDS_IN_HOUR = 60 * 60
+
+# How long each task field may be served from the cache. Names and crumbs rarely change, whereas assignments hold
+# effort remaining and done state.
+FIELD_TTL_SECS = {
+    'name': 7 * 24 * SECONDS_IN_HOUR,
+    'parent_crumbs': 7 * 24 * SECONDS_IN_HOUR,
+    'project_id': 7 * 24 * SECONDS_IN_HOUR,
+    'assignments': 6 * SECONDS_IN_HOUR,
+}
+DEFAULT_FIELD_TTL_SECS = SECONDS_IN_HOUR
+
+CREATE_TASKS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS task (
+        id INTEGER PRIMARY KEY,
+        taskJson TEXT NOT NULL,
+        fetchedAt REAL NOT NULL
+    )
+'''
+QUERY_TASKS_BY_IDS = '''
+    SELECT id, taskJson, fetchedAt
+    FROM task
+    WHERE id IN (SELECT value FROM json_each(?))
+'''
+UPSERT_TASK = '''
+    INSERT INTO task (id, taskJson, fetchedAt)
+    VALUES (?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET taskJson = excluded.taskJson, fetchedAt = excluded.fetchedAt
+'''
+
+
+class TaskCache:
+    """
+    Sidecar SQLite cache of LiquidPlanner task JSON keyed by task ID. Every fetched task is written through to the cache,
+    and cached tasks are served while all of the fields a caller needs are within their TTL.
+    """
+    def __init__(self, cache_path: str = None, refresh: bool = False):
+        self.cache_path = cache_path or get_state_path(CACHE_FILENAME)
+        self.refresh = refresh
+        self.conn: sqlite3.Connection = None
+        # The cache may be read from a background thread, so its single connection is shared under a lock
+        self._lock = threading.RLock()
+
+    def connection(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.cache_path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(CREATE_TASKS_TABLE)
+        return self.conn
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def get_max_age_secs(self, fields: List[str], max_age_secs: Dict[str, float] = None) -> float:
+        max_age_secs = max_age_secs or {}
+        return min([max_age_secs.get(field, FIELD_TTL_SECS.get(field, DEFAULT_FIELD_TTL_SECS)) for field in fields])
+
+    def get_tasks(self, task_ids: List[int], max_age: float) -> Dict[int, Tuple[dict, float]]:
+        if self.refresh or max_age <= 0:
+            return {}
+
+        oldest_fetched_at = time.time() - max_age
+        with span('task_cache.get_tasks', requested=len(task_ids)) as trace_span, self._lock:
+            res = self.connection().execute(QUERY_TASKS_BY_IDS, (json.dumps(list(task_ids)),))
+            tasks = {id: (json.loads(task_json), fetched_at) for id, task_json, fetched_at in res if fetched_at >= oldest_fetched_at}
+            trace_span.set(rows=len(tasks))
+            return tasks
+
+    def store_tasks(self, tasks_json: List[dict]) -> float:
+        fetched_at = time.time()
+        # A run which fetched nothing does not open, or create, the cache
+        if len(tasks_json) == 0:
+            return fetched_at
+
+        values = [(task['id'], json.dumps(task), fetched_at) for task in tasks_json]
+        with span('task_cache.store_tasks', rows=len(values)), self._lock:
+            conn = self.connection()
+            with conn:
+                conn.executemany(UPSERT_TASK, values)
+        return fetched_at
+
+    def fetch_timed_tasks_by_ids(self, task_ids: List[int], fields: List[str], max_age_secs: Dict[str, float] = None) -> List[Tuple[dict, float]]:
+        """
+        Returns each task paired with the time it was fetched from LiquidPlanner, only fetching tasks which are missing
+        from the cache or have a required field older than its TTL. max_age_secs overrides the TTL of individual fields.
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        cached_tasks = self.get_tasks(task_ids, self.get_max_age_secs(fields, max_age_secs))
+
+        stale_task_ids = [task_id for task_id in task_ids if task_id not in cached_tasks]
+        fetched_tasks = fetch_tasks_by_ids(stale_task_ids) if len(stale_task_ids) > 0 else []
+        fetched_at = self.store_tasks(fetched_tasks)
+
+        return list(cached_tasks.values()) + [(task_json, fetched_at) for task_json in fetched_tasks]
+
+    def fetch_tasks_by_ids(self, task_ids: List[int], fields: List[str], max_age_secs: Dict[str, float] = None) -> List[dict]:
+        """
+        Returns tasks in the same form as LiquidPlanner.fetch_tasks_by_ids, served from the cache where possible.
+        """
+        return [task_json for task_json, _ in self.fetch_timed_tasks_by_ids(task_ids, fields, max_age_secs)]
+
+
+_task_cache: TaskCache = None
+
+def get_task_cache() -> TaskCache:
+    global _task_cache
+    if _task_cache is None:
+        _task_cache = TaskCache()
+    return _task_cache
+
+def set_task_cache(task_cache: TaskCache):
+    global _task_cache
+    _task_cache = task_cache
+
+def set_refresh(refresh: bool):
+    """
+    Bypasses the cache for every read in this run when refresh is True. Fetched tasks are still written to the cache.
+    """
+    get_task_cache().refresh = refresh
+
+def fetch_cached_tasks_by_ids(task_ids: List[int], fields: List[str], max_age_secs: Dict[str, float] = None) -> List[dict]:
+    return get_task_cache().fetch_tasks_by_ids(task_ids, fields, max_age_secs)
+
+def fetch_cached_timed_tasks_by_ids(task_ids: List[int], fields: List[str], max_age_secs: Dict[str, float] = None) -> List[Tuple[dict, float]]:
+    return get_task_cache().fetch_timed_tasks_by_ids(task_ids, fields, max_age_secs)
+
+def store_tasks(tasks_json: List[dict]):
+    get_task_cache().store_tasks(tasks_json)
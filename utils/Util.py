@@ -1,9 +1,61 @@
 import datetime
-import tzlocal
+import json
+import os
 import sys
-from typing import Union
+from typing import TYPE_CHECKING, Callable, Dict, Union
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+
+EXIT_CODE_SUCCESS = 0
+EXIT_CODE_FAILURE = 1
+EXIT_CODE_USAGE = 2
+EXIT_CODE_PARTIAL_FAILURE = 3
+
+CONFIRM_ANSWER_KEY = 'confirm'
+
+STATE_DIRECTORY_ENV = 'MEMTIME_TIMESHEETER_STATE_DIR'
+DEFAULT_STATE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.memtime-timesheeter')
+
+_non_interactive = False
+_local_timezone: datetime.tzinfo = None
+_background_executor = None
+_answers: Dict[str, bool] = {}
+_result: dict = {}
+
+def set_non_interactive(non_interactive: bool):
+    global _non_interactive
+    _non_interactive = non_interactive
+
+def is_non_interactive() -> bool:
+    return _non_interactive
+
+def set_answer(answer_key: str, answer: Union[bool, None]):
+    """
+    Presets the answer to questions asked with answer_key, used instead of prompting when running non-interactively.
+    """
+    if answer is None:
+        _answers.pop(answer_key, None)
+    else:
+        _answers[answer_key] = answer
+
+def record_result(key: str, value):
+    """
+    Records a value in the machine-readable result of the current run.
+    """
+    _result[key] = value
+
+def get_result() -> dict:
+    return _result
+
+def ask_question(question: str, yes_char: str = 'y', no_char: str = 'n', answer_key: str = CONFIRM_ANSWER_KEY) -> bool:
+    if _non_interactive:
+        if answer_key not in _answers:
+            print(f'ERROR: No answer given for "{question}" while running non-interactively')
+            exit(EXIT_CODE_USAGE)
+        return _answers[answer_key]
 
-def ask_question(question: str, yes_char: str = 'y', no_char: str = 'n') -> bool:
     while True:
         res = input(f'{question} [{yes_char}/{no_char}]: ').lower()
         if res == yes_char.lower():
@@ -11,6 +63,27 @@ def ask_question(question: str, yes_char: str = 'y', no_char: str = 'n') -> bool
         elif res == no_char.lower():
             return False
 
+def get_local_timezone() -> datetime.tzinfo:
+    """
+    Returns the local timezone, looked up once per process as tzlocal reads system configuration on every call.
+    """
+    global _local_timezone
+    if _local_timezone is None:
+        import tzlocal
+        _local_timezone = tzlocal.get_localzone()
+    return _local_timezone
+
+def run_in_background(function: Callable, *args, **kwargs) -> 'Future':
+    """
+    Starts function on a shared worker thread and returns its Future, so independent network calls can run while local
+    work continues. Exceptions are raised when the result is requested.
+    """
+    global _background_executor
+    if _background_executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background')
+    return _background_executor.submit(function, *args, **kwargs)
+
 def get_epoch_from_datetime(dt: datetime.datetime = None) -> int:
     if dt is None:
         date_time = datetime.datetime.now(datetime.timezone.utc)
@@ -19,7 +92,7 @@ def get_epoch_from_datetime(dt: datetime.datetime = None) -> int:
     else:
         date_time = dt
         epoch_time = datetime.datetime(1970, 1, 1, 0, 0, 0)
-        timezone_offset_secs = -int(date_time.astimezone(tzlocal.get_localzone()).utcoffset().total_seconds())
+        timezone_offset_secs = -int(date_time.astimezone(get_local_timezone()).utcoffset().total_seconds())
     return round((date_time - epoch_time).total_seconds() + timezone_offset_secs)
 
 def parse_liquid_planner_id(description: str) -> Union[int, None]:
@@ -38,6 +111,30 @@ def parse_liquid_planner_id(description: str) -> Union[int, None]:
     except:
         return None
 
+def get_state_path(filename: str) -> str:
+    """
+    Returns the path of a file in the local state directory used for caches and hints, creating the directory if needed.
+    """
+    state_directory = os.environ.get(STATE_DIRECTORY_ENV) or DEFAULT_STATE_DIRECTORY
+    os.makedirs(state_directory, exist_ok=True)
+    return os.path.join(state_directory, filename)
+
+def load_state_json(filename: str, default=None):
+    try:
+        with open(get_state_path(filename)) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return default
+
+def save_state_json(filename: str, data):
+    # Written to a temporary file first so a crash never leaves a partially written state file
+    path = get_state_path(filename)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(data, state_file)
+    os.replace(temp_path, path)
+
 def exit(code: int):
-    input('\nPress enter to close...')
+    if not _non_interactive:
+        input('\nPress enter to close...')
     sys.exit(code)